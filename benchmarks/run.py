@@ -0,0 +1,143 @@
+"""
+Benchmarks a StaffoAccount against a local MockStaffomatic server and reports, for each scenario, the wall time,
+throughput and per-request latency, so that changes to pagination, the bootstrap of cached metadata or the bulk write
+paths can be compared before and after.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.run --shifts 20000 --per-page 100 --latency 0.01 --repeat 5
+    python -m benchmarks.run --scenario bootstrap --scenario bulk_create --rate 50 --json results.json
+"""
+import argparse
+import json
+import statistics
+import time
+from pystaffo import StaffoAccount
+from pystaffo.metrics import Metrics
+from pystaffo.scheduler import TokenBucket
+from .server import Dataset, MockStaffomatic, SUBDOMAIN
+
+
+def bootstrap(account, options):
+    account.timezone
+    return sum(len(departments) for departments in account.departments.values())
+
+
+def paginate_users(account, options):
+    return len(account.get_all_users())
+
+
+def paginate_shifts(account, options):
+    return len(account.get_shifts())
+
+
+def stream_shifts(account, options):
+    return sum(1 for _ in account.get_shifts(stream=True))
+
+
+def date_range(account, options):
+    return len(account.get_shifts(location_id=1, start_date='2024-03-01', end_date='2024-05-31'))
+
+
+def date_range_sharded(account, options):
+    return len(account.get_shifts(location_id=1, start_date='2024-03-01', end_date='2024-05-31', shard='week'))
+
+
+def bulk_create(account, options):
+    batch = [{'location_id': 1, 'department_id': 100, 'schedule_id': 1000,
+              'starts_at': '2024-06-{day:02d} 09:00:00'.format(day=n % 28 + 1),
+              'ends_at': '2024-06-{day:02d} 17:00:00'.format(day=n % 28 + 1)} for n in range(options.creates)]
+    return sum(1 for result in account.create_shifts(batch) if result.error is None)
+
+
+# Each scenario is run on an account that has already loaded its metadata, apart from bootstrap, which starts afresh.
+SCENARIOS = {'bootstrap': bootstrap, 'paginate_users': paginate_users, 'paginate_shifts': paginate_shifts,
+             'stream_shifts': stream_shifts, 'date_range': date_range, 'date_range_sharded': date_range_sharded,
+             'bulk_create': bulk_create}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(name, server, options):
+    """
+    Runs a scenario options.repeat times, each on a new account, and returns its timings and request statistics.
+    """
+    walls, counts, latencies, requests, retries = [], [], [], 0, 0
+    for _ in range(options.repeat):
+        metrics = Metrics()
+        account = StaffoAccount(SUBDOMAIN, 'user', 'password', workers=options.workers, metrics=metrics,
+                                rate_limiter=TokenBucket(rate=options.client_rate, burst=options.client_burst),
+                                api_url=server.api_url)
+        with account:
+            if name != 'bootstrap':
+                account.departments
+            metrics.reset()
+            seconds = []
+            metrics.subscribe(lambda event: seconds.append(event['seconds']) if event['event'] == 'request' else None)
+            started = time.perf_counter()
+            counts.append(SCENARIOS[name](account, options))
+            walls.append(time.perf_counter() - started)
+        latencies += seconds
+        requests += len(seconds)
+        retries += sum(stats.retries for stats in metrics.endpoints.values())
+    wall = statistics.median(walls)
+    return {'scenario': name, 'records': counts[-1], 'wall_median': wall, 'wall_best': min(walls),
+            'records_per_second': counts[-1] / wall if wall else 0.0,
+            'requests': requests / options.repeat, 'requests_per_second': requests / sum(walls) if sum(walls) else 0.0,
+            'latency_p50': percentile(latencies, 0.5), 'latency_p95': percentile(latencies, 0.95),
+            'latency_p99': percentile(latencies, 0.99), 'retries': retries / options.repeat}
+
+
+def report(results):
+    print('{:<20} {:>8} {:>10} {:>10} {:>11} {:>9} {:>9} {:>8} {:>8} {:>8} {:>8}'.format(
+        'scenario', 'records', 'median s', 'best s', 'records/s', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'retries'))
+    for result in results:
+        print('{scenario:<20} {records:>8} {wall_median:>10.3f} {wall_best:>10.3f} {records_per_second:>11.0f} '
+              '{requests:>9.1f} {requests_per_second:>9.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {retries:>8.1f}'.format(
+                  p50=result['latency_p50'] * 1000, p95=result['latency_p95'] * 1000,
+                  p99=result['latency_p99'] * 1000, **result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='scenario to run, may be repeated (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each scenario (default: 3)')
+    parser.add_argument('--locations', type=int, default=2)
+    parser.add_argument('--departments', type=int, default=4, help='departments per location')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--shifts', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365, help='days the shifts and events are spread over')
+    parser.add_argument('--per-page', type=int, default=300, help='largest page the server returns')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server adds to every request')
+    parser.add_argument('--rate', type=float, default=None, help="server's rate limit in requests per second")
+    parser.add_argument('--burst', type=int, default=10, help="server's rate limit burst")
+    parser.add_argument('--client-rate', type=float, default=1000.0, help="account's own rate limit")
+    parser.add_argument('--client-burst', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4, help="account's number of workers")
+    parser.add_argument('--creates', type=int, default=200, help='shifts created by bulk_create')
+    parser.add_argument('--json', help='also write the results to this file')
+    options = parser.parse_args(argv)
+
+    data = Dataset(locations=options.locations, departments=options.departments, users=options.users,
+                   shifts=options.shifts, events=options.events, days=options.days)
+    results = []
+    with MockStaffomatic(data, per_page=options.per_page, latency=options.latency, rate=options.rate,
+                         burst=options.burst) as server:
+        for name in options.scenario or SCENARIOS:
+            results.append(measure(name, server, options))
+    report(results)
+    if options.json:
+        with open(options.json, 'w') as fh:
+            json.dump({'options': vars(options), 'results': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+A local stand-in for the Staffomatic v3 API, for benchmarking a StaffoAccount without touching a real account.
+It serves generated accounts, locations, departments, users, schedules, shifts, events and applications with the API's
+pagination headers, filters shifts and events by date range, and accepts the writes StaffoAccount makes. The volume of
+data, the largest page served, a latency added to every request and a rate limit (answered with 429 and Retry-After) can
+all be set.
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+SUBDOMAIN = 'bench'
+RESOURCES = ('locations', 'departments', 'users', 'schedules', 'shifts', 'events', 'applications')
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+
+
+class Dataset:
+    def __init__(self, locations=2, departments=4, users=500, schedules=12, shifts=5000, events=2000, applications=200,
+                 days=365, time_zone='Europe/Berlin'):
+        """
+        The numbers of each kind of record to generate; departments and schedules are per location and shifts, events
+        and applications are spread over `days` days from the start of 2024.
+        """
+        self.time_zone = time_zone
+        self._lock = threading.Lock()
+        self.locations = [{'id': loc, 'name': 'Location {loc}'.format(loc=loc)} for loc in range(1, locations + 1)]
+        self.departments = [{'id': loc['id'] * 100 + dep, 'name': 'Department {dep}'.format(dep=dep),
+                             'location_id': loc['id']} for loc in self.locations for dep in range(departments)]
+        self.users = [{'id': user, 'first_name': 'User', 'last_name': str(user), 'state': 'active',
+                       'location_ids': [self.departments[user % len(self.departments)]['location_id']],
+                       'department_ids': [self.departments[user % len(self.departments)]['id']],
+                       'updated_at': _timestamp(START)} for user in range(1, users + 1)]
+        self.schedules = [{'id': loc['id'] * 1000 + n, 'location_id': loc['id'],
+                           'bop': (START + timedelta(days=30 * n)).strftime('%Y-%m-%d'),
+                           'eop': (START + timedelta(days=30 * n + 29)).strftime('%Y-%m-%d'),
+                           'updated_at': _timestamp(START)} for loc in self.locations for n in range(schedules)]
+        self.shifts = []
+        for n in range(shifts):
+            department = self.departments[n % len(self.departments)]
+            self.add_shift({'location_id': department['location_id'], 'department_id': department['id'],
+                            'schedule_id': department['location_id'] * 1000 + (n * days // shifts) // 30 % schedules,
+                            'starts_at': _timestamp(START + timedelta(days=n * days // shifts, hours=9)),
+                            'ends_at': _timestamp(START + timedelta(days=n * days // shifts, hours=17)),
+                            'desired_coverage': 2, 'note': None,
+                            'assigned_user_ids': [self.users[n % len(self.users)]['id']] if self.users else []})
+        self.events = [{'id': n, 'event_type': 'shift_updated', 'delivery_state': 'delivered',
+                        'eventable_type': 'Shift', 'eventable_id': n % max(1, shifts), 'user_id': None,
+                        'location_id': self.locations[n % len(self.locations)]['id'],
+                        'created_at': _timestamp(START + timedelta(seconds=n * days * 86400 // max(1, events)))}
+                       for n in range(1, events + 1)]
+        self.applications = [{'id': n, 'user_id': self.users[n % len(self.users)]['id'] if self.users else None,
+                              'shift_id': n % max(1, shifts), 'state': 'pending'} for n in range(1, applications + 1)]
+
+    def add_shift(self, shift):
+        with self._lock:
+            shift = dict(shift, id=len(self.shifts) + 1, updated_at=_timestamp(datetime.now(tz=timezone.utc)))
+            shift['_span'] = (_parse(shift['starts_at']), _parse(shift['ends_at']))
+            self.shifts.append(shift)
+            return shift
+
+
+def _parse(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class TokenBucket:
+    """
+    The server's side of a rate limit: each request takes a token, and one arriving when there are none is refused.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Takes a token, returning 0 if there was one or otherwise the number of seconds until there will be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data=None, headers=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _admit(self):
+        """
+        Applies the server's latency and rate limit, answering with 429 if the request is refused.
+        """
+        mock = self.server.mock
+        mock.count(self.command)
+        if mock.latency:
+            time.sleep(mock.latency)
+        if mock.limiter is not None:
+            wait = mock.limiter.take()
+            if wait:
+                mock.count('429')
+                self._send(429, {'error': 'Rate limit exceeded'}, {'Retry-After': '{:.3f}'.format(wait)})
+                return False
+        return True
+
+    def _path(self):
+        url = urlparse(self.path)
+        prefix = '/v3/{subdomain}/'.format(subdomain=SUBDOMAIN)
+        if not url.path.startswith(prefix):
+            return None, {}
+        return url.path[len(prefix):], parse_qs(url.query)
+
+    def _page(self, records, query):
+        """
+        Serves one page of records with Total, Per-Page, Page and Link headers.
+        """
+        per_page = min(int(query.get('per_page', [self.server.mock.per_page])[0]), self.server.mock.per_page)
+        page = int(query.get('page', ['1'])[0])
+        chunk = [{key: value for key, value in record.items() if not key.startswith('_')}
+                 for record in records[(page - 1) * per_page:page * per_page]]
+        last = max(1, -(-len(records) // per_page))
+        headers = {'Total': str(len(records)), 'Per-Page': str(per_page),
+                   'Link': '<{url}?page={last}&per_page={per_page}>; rel="last"'.format(
+                       url=self.path.split('?')[0], last=last, per_page=per_page)}
+        if chunk:
+            headers['Page'] = str(page)
+        self._send(200, chunk, headers)
+
+    def do_GET(self):
+        if not self._admit():
+            return
+        path, query = self._path()
+        data = self.server.mock.data
+        if path is None:
+            return self._send(404, {'error': 'Not found'})
+        if path == 'account.json':
+            return self._send(200, {'id': 1, 'subdomain': SUBDOMAIN, 'time_zone': data.time_zone})
+        match = re.match(r'^(locations|departments|schedules|shifts|users|applications)/(\d+)\.json$', path)
+        if match:
+            records = {record['id']: record for record in getattr(data, match.group(1))}
+            record = records.get(int(match.group(2)))
+            if record is None:
+                return self._send(404, {'error': 'Not found'})
+            return self._send(200, {key: value for key, value in record.items() if not key.startswith('_')})
+        match = re.match(r'^(?:(locations|schedules)/(\d+)/)?(\w+)\.json$', path)
+        if not match or match.group(3) not in RESOURCES:
+            return self._send(404, {'error': 'Not found'})
+        parent, parent_id, name = match.group(1), match.group(2), match.group(3)
+        records = getattr(data, name)
+        if parent == 'locations':
+            records = [record for record in records if record.get('location_id') == int(parent_id) or
+                       int(parent_id) in record.get('location_ids', ())]
+        elif parent == 'schedules':
+            records = [record for record in records if record.get('schedule_id') == int(parent_id)]
+        if 'department_ids[]' in query or 'department_ids' in query:
+            department_id = int((query.get('department_ids[]') or query.get('department_ids'))[0])
+            records = [record for record in records if record.get('department_id') == department_id or
+                       department_id in record.get('department_ids', ())]
+        if 'from' in query and 'until' in query:
+            start, end = _parse(query['from'][0]), _parse(query['until'][0])
+            if name == 'shifts':
+                records = [record for record in records if record['_span'][1] > start and record['_span'][0] <= end]
+            elif name == 'events':
+                records = [record for record in records if start <= _parse(record['created_at']) <= end]
+        if 'user_id' in query:
+            records = [record for record in records if record.get('user_id') == int(query['user_id'][0])]
+        self._page(records, query)
+
+    def _write(self):
+        if not self._admit():
+            return
+        path, query = self._path()
+        length = int(self.headers.get('Content-Length') or 0)
+        params = json.loads(self.rfile.read(length) or b'{}')
+        if path is None:
+            return self._send(404, {'error': 'Not found'})
+        if self.command == 'POST' and re.match(r'^schedules/\d+/shifts\.json$', path):
+            shift = self.server.mock.data.add_shift(params)
+            return self._send(200, {key: value for key, value in shift.items() if not key.startswith('_')})
+        match = re.match(r'^\w+/(\d+)', path)
+        self._send(200, dict(params, id=int(match.group(1)) if match else 1))
+
+    do_PUT = _write
+    do_POST = _write
+
+
+class MockStaffomatic:
+    def __init__(self, data=None, per_page=300, latency=0.0, rate=None, burst=10, host='127.0.0.1', port=0):
+        """
+        data is the Dataset served and per_page the largest page the server returns, whatever is asked for. latency is a
+        number of seconds added to every request, and rate, if given, the requests per second allowed on average, with
+        bursts of up to `burst`.
+        """
+        self.data = data or Dataset()
+        self.per_page = per_page
+        self.latency = latency
+        self.limiter = TokenBucket(rate, burst) if rate else None
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def api_url(self):
+        """
+        The url to give a StaffoAccount as api_url, with subdomain SUBDOMAIN.
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}/v3/'.format(host=host, port=port)
+
+    def count(self, key):
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
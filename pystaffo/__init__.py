@@ -1 +1,2 @@
 from .staffo import StaffoAccount
+from .asynchronous import AsyncStaffoAccount
@@ -0,0 +1,435 @@
+"""
+An AsyncStaffoAccount offers the same methods as a StaffoAccount, but each returns an awaitable (or, with stream set,
+an async generator) and the calls are made over a pooled aiohttp session, so that one event loop can drive many
+requests across many locations at once.
+aiohttp is an optional dependency: install it with `pip install PyStaffo[async]`.
+"""
+import asyncio
+import time
+import pytz
+from .staffo import StaffoAccount, API_URL, SINGLE_RESOURCES
+from .bulk import Result
+from .dates import windows, unique
+from .records import TableBuilder, compact
+from .registry import Registry
+from .scheduler import TokenBucket, retryable, retry_after, backoff, MAX_RETRIES, BACKOFF, MAX_BACKOFF
+from .paginated import PER_PAGE, WORKERS, _last_page, _paginated
+from .pooled import POOL_MAXSIZE
+from . import incremental, membership
+from .decoding import decode
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncRequestScheduler:
+    def __init__(self, session, rate_limiter=None, max_retries=MAX_RETRIES, base=BACKOFF, cap=MAX_BACKOFF,
+                 metrics=None):
+        """
+        The asyncio counterpart of scheduler.RequestScheduler, wrapping an aiohttp session.
+        """
+        self.session = session
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.metrics = metrics
+
+    async def request(self, method, url, **kwargs):
+        """
+        Makes a request once the rate limit allows, retrying it up to max_retries times, and returns the last response
+        with its body already read, so that it can still be inspected (e.g. with `await response.json()`) after the
+        connection has gone back to the pool.
+        """
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+                body = await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if self.metrics is not None:
+                    self.metrics.request(method, url, seconds=time.perf_counter() - started, attempt=attempt,
+                                         error=error)
+                if method.upper() == 'POST' or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff(attempt, base=self.base, cap=self.cap))
+                attempt += 1
+                continue
+            if self.metrics is not None:
+                self.metrics.request(method, url, status=response.status, seconds=time.perf_counter() - started,
+                                     size=len(body), attempt=attempt)
+            if attempt >= self.max_retries or not retryable(method, response.status):
+                return response
+            delay = backoff(attempt, retry_after(response.headers.get('Retry-After')), base=self.base, cap=self.cap)
+            if response.status == 429:
+                self.rate_limiter.pause(delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def _fetch(scheduler, url, params, page, fields=None):
+    """
+    GETs a single page, returning the response along with its decoded content. An unsuccessful response raises a
+    ClientResponseError rather than having its error body returned as data.
+    """
+    page_params = dict(params)
+    page_params.update({'page': page})
+    r = await scheduler.request('GET', url, params=page_params)
+    r.raise_for_status()
+    return r, decode(await r.read(), fields)
+
+
+async def get(scheduler, url, extras=None, workers=WORKERS, fields=None):
+    """
+    Paginated GET, fetching the pages after the first concurrently (up to `workers` at a time) once the first page's
+    headers show how many there are.
+    """
+    params = {'per_page': PER_PAGE}
+    if extras: params.update(extras)
+    r, data = await _fetch(scheduler, url, params, 1, fields)
+    per_page = int(r.headers.get('Per-Page', PER_PAGE))
+    if (not isinstance(data, list)) or len(data) < per_page:
+        _paginated(scheduler, url, 1)
+        return data
+    last_page = _last_page(r, per_page)
+    if last_page is not None:
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def fetch_page(page):
+            async with semaphore:
+                return (await _fetch(scheduler, url, params, page, fields))[1]
+
+        for response in await asyncio.gather(*[fetch_page(page) for page in range(2, last_page + 1)]):
+            data += response
+        _paginated(scheduler, url, max(1, last_page))
+        return data
+    page = 1
+    keep_going = True
+    while keep_going:
+        page += 1
+        r, response = await _fetch(scheduler, url, params, page, fields)
+        if (not response) or ('Page' not in r.headers):
+            keep_going = False
+        else:
+            data += response
+            keep_going = len(response) >= per_page
+    _paginated(scheduler, url, page)
+    return data
+
+
+async def get_one(scheduler, url, extras=None, fields=None):
+    """
+    GET of a single resource, made as one request without pagination parameters.
+    """
+    r = await scheduler.request('GET', url, params=extras)
+    r.raise_for_status()
+    return decode(await r.read(), fields)
+
+
+async def iterate(scheduler, url, extras=None, prefetch=True, fields=None):
+    """
+    Paginated GET as an async generator, yielding the records one page at a time. With prefetch, the next page is
+    requested while the current page is being consumed.
+    """
+    params = {'per_page': PER_PAGE}
+    if extras: params.update(extras)
+    r, response = await _fetch(scheduler, url, params, 1, fields)
+    if not isinstance(response, list):
+        yield response
+        return
+    per_page = int(r.headers.get('Per-Page', PER_PAGE))
+    last_page = _last_page(r, per_page)
+    page = 1
+    try:
+        while True:
+            more = len(response) >= per_page and (last_page is None or page < last_page)
+            upcoming = (asyncio.ensure_future(_fetch(scheduler, url, params, page + 1, fields))
+                        if more and prefetch else None)
+            try:
+                for record in response:
+                    yield record
+            except GeneratorExit:
+                if upcoming:
+                    upcoming.cancel()
+                raise
+            if not more:
+                return
+            page += 1
+            r, response = await (upcoming if upcoming else _fetch(scheduler, url, params, page, fields))
+            if (not response) or ('Page' not in r.headers):
+                return
+    finally:
+        _paginated(scheduler, url, page)
+
+
+async def run(call, items, workers=WORKERS, stop_on_error=False):
+    """
+    Awaits call(item) for every item, up to `workers` at a time, and returns a bulk.Result per item in the order the
+    items were given. With stop_on_error, once an item has failed no further items are started.
+    """
+    semaphore = asyncio.Semaphore(max(1, workers))
+    failed = asyncio.Event()
+
+    async def attempt(item):
+        async with semaphore:
+            if failed.is_set():
+                return Result(item, None, asyncio.CancelledError())
+            response = None
+            try:
+                response = await call(item)
+                response.raise_for_status()
+                return Result(item, response, None)
+            except Exception as error:
+                if stop_on_error:
+                    failed.set()
+                return Result(item, response, error)
+
+    return list(await asyncio.gather(*[attempt(item) for item in items]))
+
+
+class AsyncStaffoAccount(StaffoAccount):
+    def __init__(self, subdomain=None, username=None, password=None, limit=POOL_MAXSIZE, limit_per_host=0,
+                 keep_alive=True, workers=WORKERS, prefetch=True, metadata_cache=None, rate_limiter=None,
+                 max_retries=MAX_RETRIES, metrics=None, api_url=API_URL):
+        if aiohttp is None:
+            raise ImportError('AsyncStaffoAccount requires aiohttp: pip install PyStaffo[async]')
+        self.auth = aiohttp.BasicAuth(username or '', password or '')
+        self.subdomain = subdomain
+        self.base_url = '{api_url}{subdomain}/'.format(api_url=api_url, subdomain=subdomain)
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keep_alive = keep_alive
+        self.workers = workers
+        self.prefetch = prefetch
+        self.metadata_cache = metadata_cache
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.session = None
+        self.scheduler = None
+        self.timezone = None
+        self._registry = None
+        self._departments = None
+        self._times = None
+
+    def __enter__(self):
+        raise TypeError('AsyncStaffoAccount is opened with `async with`, not `with`')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        """
+        Opens the pooled session, which must happen inside the running event loop, and loads the account's timezone,
+        locations and departments. Called by `async with`.
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             force_close=not self.keep_alive)
+            self.session = aiohttp.ClientSession(auth=self.auth, connector=connector)
+            self.scheduler = AsyncRequestScheduler(self.session, rate_limiter=self.rate_limiter,
+                                                   max_retries=self.max_retries, metrics=self.metrics)
+        await self.bootstrap()
+
+    async def close(self):
+        """
+        Closes the pooled connections held by the account's session.
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self.scheduler = None
+
+    async def invalidate_metadata(self):
+        """
+        Forgets the timezone, locations and departments, both on the instance and in the metadata cache, and loads them
+        afresh, since the account's methods need them to be loaded.
+        """
+        self._timezone = None
+        self._registry = None
+        self._departments = None
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(self.subdomain)
+        await self.bootstrap()
+
+    async def bootstrap(self):
+        """
+        Loads the timezone, the locations and every location's departments, the latter all at once, from the metadata
+        cache where it holds fresh copies. Cached departments whose locations differ from the cached locations are
+        stale, and both are fetched afresh.
+        """
+        cache = self.metadata_cache
+        locations, departments = None, None
+        if cache is not None:
+            timezone = cache.load(self.subdomain, 'timezone')
+            locations = cache.load(self.subdomain, 'locations')
+            departments = cache.load(self.subdomain, 'departments')
+            self.timezone = pytz.timezone(timezone) if timezone else None
+            if locations is not None and departments is not None and set(departments) != set(locations):
+                departments = None
+        if self._timezone is None:
+            r = await self.scheduler.request('GET', self.base_url + 'account.json')
+            if r.status != 200:
+                raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status,
+                                                  message='Invalid Authentication')
+            data = decode(await r.read())
+            self.timezone = pytz.timezone(data['time_zone'])
+            if cache is not None:
+                cache.save(self.subdomain, 'timezone', self.timezone.zone)
+        if locations is None or departments is None:
+            details = await self._get('locations.json', fields=('id', 'name'))
+            locations = {location['name']: location['id'] for location in details}
+            responses = await asyncio.gather(*[
+                self._get('locations/{loc_id}/departments.json'.format(loc_id=loc_id), fields=('id', 'name'))
+                for loc_id in locations.values()])
+            departments = {loc_name: {department['name']: department['id'] for department in details}
+                           for loc_name, details in zip(locations, responses)}
+        self._registry = Registry(locations, departments)
+        self._departments = self._registry.departments
+        self._store_mappings()
+
+    def _cached(self, attribute, load):
+        if getattr(self, attribute) is None:
+            raise RuntimeError('Open the account with `async with` or `await account.open()` first')
+        return getattr(self, attribute)
+
+    def _get(self, extension, extras=None, stream=False, fields=None):
+        if stream:
+            return iterate(self.scheduler, self.base_url + extension, extras=extras, prefetch=self.prefetch,
+                           fields=fields)
+        return get(self.scheduler, self.base_url + extension, extras=extras, workers=self.workers, fields=fields)
+
+    def _get_one(self, extension, extras=None, fields=None):
+        return get_one(self.scheduler, self.base_url + extension, extras=extras, fields=fields)
+
+    async def get_many(self, kind, ids, fields=None):
+        if kind not in SINGLE_RESOURCES:
+            raise ValueError('kind must be one of {kinds}'.format(kinds=', '.join(SINGLE_RESOURCES)))
+        ids = list(dict.fromkeys(ids))
+        semaphore = asyncio.Semaphore(max(1, self.workers))
+
+        async def fetch(record_id):
+            async with semaphore:
+                try:
+                    return await self._get_one('{kind}/{id}.json'.format(kind=kind, id=record_id), fields=fields)
+                except aiohttp.ClientResponseError as error:
+                    if error.status != 404:
+                        raise
+                    return None
+
+        return dict(zip(ids, await asyncio.gather(*[fetch(record_id) for record_id in ids])))
+
+    def _dated(self, extension, params, start_date, end_date=None, shard=None, stream=False, fields=None):
+        if not shard:
+            return super()._dated(extension, params, start_date, end_date, stream=stream, fields=fields)
+        extras = [dict(params, **self.times.range_params(start, end))
+                  for start, end in windows(start_date, end_date or self.times.today(), shard)]
+        if stream:
+            return self._stream_windows(extension, extras, fields)
+        return self._gather_windows(extension, extras, fields)
+
+    async def _gather_windows(self, extension, extras, fields=None):
+        semaphore = asyncio.Semaphore(max(1, self.workers))
+
+        async def fetch_window(window):
+            async with semaphore:
+                return await self._get(extension, extras=window, fields=fields)
+
+        results = await asyncio.gather(*[fetch_window(window) for window in extras])
+        return list(unique(record for result in results for record in result))
+
+    async def _stream_windows(self, extension, extras, fields=None):
+        seen = set()
+        for window in extras:
+            async for record in self._get(extension, extras=window, stream=True, fields=fields):
+                key = record.get('id') if isinstance(record, dict) else None
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield record
+
+    def _compact(self, records, kind, form, stream):
+        if form not in ('records', 'table'):
+            raise ValueError("compact must be 'records' or 'table'")
+        if stream and form == 'records':
+            return self._stream_compact(records, kind)
+        return self._gather_compact(records, kind, form, stream)
+
+    async def _stream_compact(self, records, kind):
+        async for data in records:
+            yield kind.from_dict(data)
+
+    async def _gather_compact(self, records, kind, form, stream):
+        if not stream:
+            return compact(await records, kind, form)
+        builder = TableBuilder(kind)
+        async for data in records:
+            builder.add(data)
+        return builder.build()
+
+    def _put(self, extension, params):
+        return self.scheduler.request('PUT', self.base_url + extension, json=params)
+
+    def _post(self, extension, params):
+        return self.scheduler.request('POST', self.base_url + extension, json=params)
+
+    async def _then(self, response, callback):
+        response = await response
+        if response.status == 200:
+            callback(decode(await response.read()))
+        return response
+
+    def create_shifts(self, batch, stop_on_error=False):
+        return run(lambda kwargs: self.create_shift(**kwargs), batch, workers=self.workers,
+                   stop_on_error=stop_on_error)
+
+    def assign_users_to_shifts(self, pairs, stop_on_error=False):
+        return run(lambda pair: self.assign_user_to_shift(shift_id=pair[0], user_id=pair[1]), pairs,
+                   workers=self.workers, stop_on_error=stop_on_error)
+
+    def sync(self, resource, snapshot, **kwargs):
+        return incremental.sync_async(self, resource, snapshot, extras=kwargs)
+
+    async def sync_department_members(self, department_id=None, loc_name=None, dep_name=None, user_ids=None,
+                                      chunk_size=membership.CHUNK_SIZE):
+        membership.check(user_ids)
+        if not department_id:
+            department_id = self.departments[loc_name][dep_name]
+        extension, extras = membership.members_request(self, department_id)
+        added, removed, calls = membership.plan(await self._get(extension, extras=extras), user_ids, chunk_size)
+        semaphore = asyncio.Semaphore(max(1, self.workers))
+
+        async def send(chunk, remove):
+            async with semaphore:
+                return await self.add_users(department_id=department_id, users=chunk, remove=remove)
+
+        responses = await asyncio.gather(*[send(chunk, remove) for chunk, remove in calls])
+        return membership.Membership(added, removed, list(responses))
+
+    async def sync_memberships(self, memberships, chunk_size=membership.CHUNK_SIZE):
+        department_ids = list(memberships)
+        for department_id in department_ids:
+            membership.check(memberships[department_id])
+        semaphore = asyncio.Semaphore(max(1, self.workers))
+
+        async def sync_department(department_id):
+            async with semaphore:
+                return await self.sync_department_members(department_id=department_id,
+                                                          user_ids=memberships[department_id], chunk_size=chunk_size)
+
+        return dict(zip(department_ids, await asyncio.gather(*[sync_department(department_id)
+                                                               for department_id in department_ids])))
@@ -0,0 +1,45 @@
+"""
+Bulk runs one API call per item over a bounded pool of threads, for the endpoints that have no bulk form of their own.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from threading import Event
+from .paginated import WORKERS
+
+# The outcome for one item: the response if a request was made, and the error if it failed (an HTTPError for an
+# unsuccessful status, a CancelledError if it was never started because an earlier item failed).
+Result = namedtuple('Result', ['item', 'response', 'error'])
+
+
+def run(call, items, workers=WORKERS, stop_on_error=False):
+    """
+    Calls call(item) for every item, up to `workers` at a time, and returns a Result per item in the order the items
+    were given. Items are taken from the iterable as capacity frees up rather than all at once.
+    With stop_on_error, once an item has failed no further items are started.
+    """
+    workers = max(1, workers)
+    failed = Event()
+
+    def attempt(item):
+        if failed.is_set():
+            return Result(item, None, CancelledError())
+        response = None
+        try:
+            response = call(item)
+            response.raise_for_status()
+            return Result(item, response, None)
+        except Exception as error:
+            if stop_on_error:
+                failed.set()
+            return Result(item, response, error)
+
+    results = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            pending.append(pool.submit(attempt, item))
+            if len(pending) >= 2 * workers:
+                results.append(pending.popleft().result())
+        while pending:
+            results.append(pending.popleft().result())
+    return results
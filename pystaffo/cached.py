@@ -2,28 +2,29 @@
 Cached does what it says on the tin.
 """
 import requests
-import json
 import pytz
+from concurrent.futures import ThreadPoolExecutor
 from . import paginated
+from .decoding import decode
 
 
-def get_timezone(auth, base_url):
+def get_timezone(auth, base_url, session=None):
     """
     Gets the account information which includes the timezone, and returns this timezone as a pytz.timezone object.
     """
-    r = requests.get(url=base_url + 'account.json', auth=auth)
+    r = (session or requests).get(url=base_url + 'account.json', auth=auth)
     if r.status_code is not 200:
         raise requests.exceptions.HTTPError('Invalid Authentication')
-    data = json.loads(r.content.decode('utf-8'))
+    data = decode(r.content)
     return pytz.timezone(data['time_zone'])
 
 
-def get_location_mapping(auth, base_url):
+def get_location_mapping(auth, base_url, session=None):
     """
     Gets the locations on a Staffomatic account and returns a dictionary with the location names as the keys and the
     location id numbers as the values.
     """
-    details = paginated.get(auth=auth, url=base_url + 'locations.json')
+    details = paginated.get(auth=auth, url=base_url + 'locations.json', session=session, fields=('id', 'name'))
     keys, values = [], []
     for i in range(len(details)):
         keys += [details[i]['name']]
@@ -31,19 +32,20 @@ def get_location_mapping(auth, base_url):
     return dict(zip(keys, values))
 
 
-def get_department_mapping(auth, base_url):
+def get_department_mapping(auth, base_url, session=None, locations=None, workers=paginated.WORKERS):
     """
     Gets the departments on a Staffomatic account and returns a dictionary of dictionaries withh the location names
     as the keys and the department names as the keys within, with the department ids as the values.
+    An already fetched location mapping can be passed in to save fetching it again. The departments of up to `workers`
+    locations are fetched at once.
     """
-    locations = get_location_mapping(auth, base_url)
-    departments = {}
-    for key, value in locations.items():
-        details = paginated.get(auth, base_url + 'locations/{loc_id}/departments.json'.format(loc_id=value))
-        keys, values = [], []
-        for i in range(len(details)):
-            keys += [details[i]['name']]
-            values += [details[i]['id']]
-        loc_departments = dict(zip(keys, values))
-        departments.update({key: loc_departments})
-    return departments
+    if locations is None:
+        locations = get_location_mapping(auth, base_url, session=session)
+
+    def loc_departments(loc_id):
+        details = paginated.get(auth, base_url + 'locations/{loc_id}/departments.json'.format(loc_id=loc_id),
+                                session=session, fields=('id', 'name'))
+        return {details[i]['name']: details[i]['id'] for i in range(len(details))}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(locations.keys(), pool.map(loc_departments, locations.values())))
@@ -0,0 +1,140 @@
+"""
+Helpers for working with the dates and times the API takes and returns. A TimeConverter turns dates and local times into
+the API's ISO 8601 form in an account's timezone, remembering each date's UTC offset so that it is only looked up once.
+"""
+from datetime import datetime, date, time, timedelta
+
+SHARDS = {'day': 1, 'week': 7}
+
+
+def windows(start_date, end_date, shard):
+    """
+    Splits the range from start_date to end_date, both inclusive dates, into consecutive windows
+    of a shard's size: 'day', 'week', 'month' (calendar months) or a number of days. Yields (start, end) pairs of
+    yyyy-mm-dd strings.
+    """
+    if shard != 'month':
+        days = SHARDS.get(shard, shard)
+        if isinstance(days, bool) or not isinstance(days, int) or days < 1:
+            raise ValueError("shard must be 'day', 'week', 'month' or a positive number of days, not {shard!r}".format(
+                shard=shard))
+    start = as_date(start_date)
+    end = as_date(end_date)
+    while start <= end:
+        if shard == 'month':
+            following = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            following = start + timedelta(days=days)
+        yield start.strftime('%Y-%m-%d'), min(following - timedelta(days=1), end).strftime('%Y-%m-%d')
+        start = following
+
+
+def unique(records):
+    """
+    Yields the records in order, skipping any whose id has already been seen, e.g. a shift overlapping two windows.
+    """
+    seen = set()
+    for record in records:
+        key = record.get('id') if isinstance(record, dict) else None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        yield record
+
+
+def parse(timestamp):
+    """
+    Parses an ISO 8601 timestamp as the API writes them, e.g. 2019-01-01T09:00:00.000+01:00 or ...Z.
+    """
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def as_date(value):
+    """
+    A date from a date, a datetime or a yyyy-mm-dd string.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def as_datetime(value):
+    """
+    A datetime from a datetime, a date (taken as its midnight) or a 'yyyy-mm-dd HH:MM:SS' or yyyy-mm-dd string.
+    """
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return datetime.fromisoformat(value[:19])
+
+
+class TimeConverter:
+    def __init__(self, timezone):
+        """
+        timezone is the account's pytz timezone.
+        """
+        self.timezone = timezone
+        self._offsets = {}
+
+    def _offset(self, moment):
+        """
+        The UTC offset, as +hh:mm, of a naive local datetime. The offsets at the start and end of each date are worked
+        out once and remembered; only on the days the clocks change do the two differ, and then the moment's own
+        offset is looked up.
+        """
+        day = moment.date()
+        offsets = self._offsets.get(day)
+        if offsets is None:
+            offsets = (self._lookup(datetime.combine(day, time())), self._lookup(datetime.combine(day, time.max)))
+            self._offsets[day] = offsets
+        if offsets[0] == offsets[1]:
+            return offsets[0]
+        return self._lookup(moment)
+
+    def _lookup(self, moment):
+        offset = self.timezone.localize(moment).strftime('%z')
+        return offset[:3] + ':' + offset[3:]
+
+    @staticmethod
+    def _aware(moment):
+        """
+        The API form of an aware datetime with its own UTC offset, which for a time in the hour repeated when the
+        clocks go back tells which side of the change it is on.
+        """
+        offset = moment.strftime('%z')
+        return moment.replace(tzinfo=None).isoformat(timespec='seconds') + offset[:3] + ':' + offset[3:]
+
+    def format(self, value):
+        """
+        The API form (yyyy-mm-ddTHH:MM:SS+hh:mm) of a local time given as a 'yyyy-mm-dd HH:MM:SS' string, a date or a
+        datetime. Naive datetimes are taken to be in the account's timezone and aware ones are converted to it.
+        """
+        moment = as_datetime(value)
+        if moment.tzinfo is not None:
+            return self._aware(moment.astimezone(self.timezone))
+        return moment.isoformat(timespec='seconds') + self._offset(moment)
+
+    def format_many(self, values):
+        """
+        format applied to every value, in one pass.
+        """
+        return [self.format(value) for value in values]
+
+    def today(self):
+        """
+        Today's date in the account's timezone.
+        """
+        return datetime.now(tz=self.timezone).date()
+
+    def range_params(self, start_date, end_date=None):
+        """
+        The from and until parameters covering the whole of start_date to the end of end_date (or today), each with
+        the offset in force at that moment, which differ when the range crosses a change of the clocks.
+        """
+        end = as_date(end_date) if end_date else self.today()
+        return {'from': self.format(datetime.combine(as_date(start_date), time())),
+                'until': self.format(datetime.combine(end, time(23, 59, 59)))}
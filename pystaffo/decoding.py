@@ -0,0 +1,61 @@
+"""
+Decoding turns response bodies into Python data. Bodies are parsed straight from bytes, without first being decoded to a
+str, by the fastest parser installed: orjson, then ujson, then the standard library's json. Install one with
+`pip install PyStaffo[fast]`, or choose a parser with use().
+Records can be cut down to selected fields as they are decoded, so that only what is needed of wide records is kept.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+PARSERS = {'json': json.loads}
+if ujson is not None:
+    PARSERS['ujson'] = ujson.loads
+if orjson is not None:
+    PARSERS['orjson'] = orjson.loads
+
+parser = 'orjson' if orjson is not None else 'ujson' if ujson is not None else 'json'
+_loads = PARSERS[parser]
+
+
+def use(name_or_loads):
+    """
+    Chooses the parser every response is decoded with: 'orjson', 'ujson' or 'json' if it is installed, or any
+    function taking bytes and returning the parsed data.
+    """
+    global parser, _loads
+    if callable(name_or_loads):
+        parser, _loads = getattr(name_or_loads, '__name__', 'custom'), name_or_loads
+    elif name_or_loads in PARSERS:
+        parser, _loads = name_or_loads, PARSERS[name_or_loads]
+    else:
+        raise ValueError('{name} is not installed; available parsers are {names}'.format(
+            name=name_or_loads, names=', '.join(sorted(PARSERS))))
+
+
+def select(data, fields):
+    """
+    Keeps only the given fields of a record, or of every record in a list; anything else is returned unchanged.
+    """
+    if isinstance(data, list):
+        return [{field: record[field] for field in fields if field in record} if isinstance(record, dict) else record
+                for record in data]
+    if isinstance(data, dict):
+        return {field: data[field] for field in fields if field in data}
+    return data
+
+
+def decode(content, fields=None):
+    """
+    Parses a response body given as bytes, keeping only `fields` of each record if they are given.
+    """
+    data = _loads(content)
+    return select(data, fields) if fields else data
@@ -0,0 +1,147 @@
+"""
+Incremental keeps a local snapshot of an account's shifts, users, schedules or applications together with a checkpoint
+per resource, so that each sync after the first only fetches what has been created, updated or removed since the last.
+"""
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+import pytz
+from .dates import parse
+
+# The parameter each resource's listing is filtered by to return only records updated since a time. The records
+# returned are checked against the checkpoint as well, so a filter the server ignores costs bandwidth but not accuracy.
+UPDATED_FILTERS = {'shifts': 'updated_since', 'users': 'updated_since', 'schedules': 'updated_since'}
+# Resources without such a filter are brought up to date from the events feed, by the type of the records its events
+# refer to. Events are also the only way removals are seen.
+EVENTABLE_TYPES = {'shifts': 'Shift', 'users': 'User', 'schedules': 'Schedule', 'applications': 'Application'}
+
+Changes = namedtuple('Changes', ['changed', 'removed'])
+
+
+class Snapshot:
+    def __init__(self, path=None):
+        """
+        path is an optional JSON file the snapshot is loaded from and saved to.
+        """
+        self.path = path
+        self.resources = {}
+        self.checkpoints = {}
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                data = json.load(fh)
+            self.resources = data['resources']
+            self.checkpoints = data['checkpoints']
+
+    def records(self, resource):
+        """
+        The snapshot's records of a resource as a dictionary keyed by id (as a string).
+        """
+        return self.resources.setdefault(resource, {})
+
+    def checkpoint(self, resource):
+        """
+        The time, as an ISO 8601 string, up to which the resource is known to be up to date, or None if never synced.
+        """
+        return self.checkpoints.get(resource)
+
+    def apply(self, resource, changed, removed, checkpoint):
+        records = self.records(resource)
+        for record in changed:
+            records[str(record['id'])] = record
+        for record_id in removed:
+            records.pop(str(record_id), None)
+        self.checkpoints[resource] = checkpoint
+
+    def save(self):
+        if self.path:
+            with open(self.path, 'w') as fh:
+                json.dump({'resources': self.resources, 'checkpoints': self.checkpoints}, fh)
+
+
+def sync(account, resource, snapshot, extras=None):
+    """
+    Brings the snapshot's copy of a resource up to date and returns the Changes made. The first sync of a resource
+    fetches all of it (filtered by extras); later ones fetch only what changed since the checkpoint, by the resource's
+    updated filter if it has one and otherwise from the events feed.
+    """
+    extension = '{resource}.json'.format(resource=resource)
+    checkpoint = snapshot.checkpoint(resource)
+    started = datetime.now(tz=pytz.utc).isoformat()
+    removed = []
+    if checkpoint is None:
+        changed = account._get(extension, extras=extras)
+    elif resource in UPDATED_FILTERS:
+        changed = _updated(account._get(extension, extras=_updated_params(resource, checkpoint, extras)), checkpoint)
+    else:
+        events = account.get_events(start_date=_events_since(account, checkpoint))
+        changed, removed = _split(account.get_many(resource, _event_ids(events, resource, checkpoint)))
+    return _apply(snapshot, resource, changed, removed, started)
+
+
+async def sync_async(account, resource, snapshot, extras=None):
+    """
+    sync for an AsyncStaffoAccount, whose fetches are awaited.
+    """
+    extension = '{resource}.json'.format(resource=resource)
+    checkpoint = snapshot.checkpoint(resource)
+    started = datetime.now(tz=pytz.utc).isoformat()
+    removed = []
+    if checkpoint is None:
+        changed = await account._get(extension, extras=extras)
+    elif resource in UPDATED_FILTERS:
+        changed = _updated(await account._get(extension, extras=_updated_params(resource, checkpoint, extras)),
+                           checkpoint)
+    else:
+        events = await account.get_events(start_date=_events_since(account, checkpoint))
+        changed, removed = _split(await account.get_many(resource, _event_ids(events, resource, checkpoint)))
+    return _apply(snapshot, resource, changed, removed, started)
+
+
+def _apply(snapshot, resource, changed, removed, started):
+    snapshot.apply(resource, changed, removed, started)
+    snapshot.save()
+    return Changes(changed, removed)
+
+
+def _updated_params(resource, checkpoint, extras):
+    params = dict(extras or {})
+    params.update({UPDATED_FILTERS[resource]: checkpoint})
+    return params
+
+
+def _updated(records, checkpoint):
+    """
+    The records updated after the checkpoint, in case the server ignored the updated filter.
+    """
+    since = parse(checkpoint)
+    return [record for record in records if record.get('updated_at') is None or parse(record['updated_at']) > since]
+
+
+def _events_since(account, checkpoint):
+    """
+    The date, in the account's timezone, from which to read the events feed.
+    """
+    return parse(checkpoint).astimezone(account.timezone).strftime('%Y-%m-%d')
+
+
+def _event_ids(events, resource, checkpoint):
+    """
+    The ids of the resource's records that events since the checkpoint refer to, each once.
+    """
+    since = parse(checkpoint)
+    ids = {}
+    for event in events:
+        if event.get('eventable_type') == EVENTABLE_TYPES[resource]:
+            if parse(event.get('created_at', checkpoint)) >= since:
+                ids[event.get('eventable_id')] = True
+    return list(ids)
+
+
+def _split(records):
+    """
+    Splits records fetched again by id into those that still exist and the ids of those that no longer do.
+    """
+    changed = [record for record in records.values() if record is not None]
+    removed = [record_id for record_id, record in records.items() if record is None]
+    return changed, removed
@@ -0,0 +1,70 @@
+"""
+Membership reconciles who belongs to a department with a desired list of users, sending only the additions and removals
+needed, in as few add_users/remove_users calls as the chunk size allows.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 100
+
+# The user ids added to and removed from a department, and the responses of the calls that did so.
+Membership = namedtuple('Membership', ['added', 'removed', 'responses'])
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def check(user_ids):
+    """
+    Refuses user_ids of None rather than taking it to mean no members, which only an empty list does.
+    """
+    if user_ids is None:
+        raise ValueError('user_ids is required; pass [] to remove every member')
+
+
+def members_request(account, department_id):
+    """
+    The extension and parameters listing a department's current members.
+    """
+    location_id = account.registry.department_location(department_id)
+    return 'locations/{id}/users.json'.format(id=location_id), {'department_ids': department_id}
+
+
+def plan(members, user_ids, chunk_size=CHUNK_SIZE):
+    """
+    The user ids to add and to remove to turn members into user_ids, and the (chunk, remove) calls that do so.
+    """
+    current = {user['id'] for user in members}
+    desired = set(user_ids)
+    added = sorted(desired - current)
+    removed = sorted(current - desired)
+    calls = [(chunk, False) for chunk in chunks(added, chunk_size)]
+    calls += [(chunk, True) for chunk in chunks(removed, chunk_size)]
+    return added, removed, calls
+
+
+def sync(account, department_id, user_ids, chunk_size=CHUNK_SIZE):
+    """
+    Makes the users of a department exactly user_ids: the current members are fetched and only the difference is sent.
+    """
+    check(user_ids)
+    extension, extras = members_request(account, department_id)
+    added, removed, calls = plan(account._get(extension, extras=extras), user_ids, chunk_size)
+    responses = [account.add_users(department_id=department_id, users=chunk, remove=remove) for chunk, remove in calls]
+    return Membership(added, removed, responses)
+
+
+def sync_all(account, memberships, chunk_size=CHUNK_SIZE, workers=None):
+    """
+    Applies sync to every department id and user ids of a dictionary, up to `workers` departments at a time, and
+    returns a dictionary of department ids to their Memberships.
+    """
+    department_ids = list(memberships)
+    for department_id in department_ids:
+        check(memberships[department_id])
+    with ThreadPoolExecutor(max_workers=max(1, workers or account.workers)) as pool:
+        results = pool.map(lambda department_id: sync(account, department_id, memberships[department_id],
+                                                      chunk_size=chunk_size), department_ids)
+        return dict(zip(department_ids, results))
@@ -0,0 +1,145 @@
+"""
+Metrics records what an account's requests cost, per endpoint: how many were made and retried, how long they took (as a
+latency histogram), how many bytes came back, which statuses and errors were seen and how many pages each paginated
+fetch needed. Callbacks can be subscribed to receive every event as it happens, and with trace set each event is also
+written to the 'pystaffo.trace' logger as a line of JSON.
+"""
+import json
+import logging
+import re
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock
+from urllib.parse import urlparse
+
+# Upper bounds, in seconds, of the latency histogram's buckets; slower requests fall in a final, unbounded bucket.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+trace_logger = logging.getLogger('pystaffo.trace')
+
+
+def endpoint(url):
+    """
+    The endpoint a url belongs to, relative to the account's base url and with ids replaced by {id}, e.g.
+    'locations/{id}/shifts.json', so that requests for different records are counted together.
+    """
+    parts = [part for part in urlparse(url).path.split('/') if part]
+    if 'v3' in parts:
+        parts = parts[parts.index('v3') + 2:]
+    return re.sub(r'(^|/)\d+(?=/|\.json|$)', r'\1{id}', '/'.join(parts))
+
+
+class EndpointStats:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses = Counter()
+        self.histogram = [0] * (len(buckets) + 1)
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.bytes = 0
+        self.paginations = 0
+        self.pages = 0
+        self.most_pages = 0
+
+    def percentile(self, fraction):
+        """
+        The upper bound of the histogram bucket holding the given fraction (e.g. 0.95) of requests, or None if that
+        lies in the unbounded bucket.
+        """
+        target = fraction * self.requests
+        seen = 0
+        for bound, count in zip(self.buckets, self.histogram):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return None if self.histogram[-1] else 0.0
+
+    def as_dict(self):
+        return {'requests': self.requests, 'retries': self.retries, 'errors': self.errors,
+                'statuses': dict(self.statuses), 'seconds': self.seconds, 'slowest': self.slowest,
+                'mean_seconds': self.seconds / self.requests if self.requests else 0.0,
+                'histogram': dict(zip([str(bound) for bound in self.buckets] + ['inf'], self.histogram)),
+                'bytes': self.bytes, 'paginations': self.paginations, 'pages': self.pages,
+                'most_pages': self.most_pages}
+
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS, trace=False):
+        """
+        buckets are the upper bounds of the latency histogram. With trace, every event is logged to 'pystaffo.trace'.
+        """
+        self.buckets = tuple(buckets)
+        self.trace = trace
+        self.endpoints = {}
+        self._callbacks = []
+        self._lock = Lock()
+
+    def subscribe(self, callback):
+        """
+        Calls callback with a dictionary for every event: {'event': 'request', ...} for each attempt at a request and
+        {'event': 'pagination', ...} for each paginated fetch.
+        """
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        self._callbacks.remove(callback)
+
+    def _stats(self, key):
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats(self.buckets)
+        return stats
+
+    def request(self, method, url, status=None, seconds=0.0, size=0, attempt=0, error=None):
+        """
+        Records one attempt at a request: its status (None if it raised error), how long it took, the size of its body
+        and which attempt it was, 0 being the first.
+        """
+        key = (method.upper(), endpoint(url))
+        with self._lock:
+            stats = self._stats(key)
+            stats.requests += 1
+            stats.retries += attempt > 0
+            stats.errors += error is not None or (status or 0) >= 400
+            stats.statuses[status if error is None else type(error).__name__] += 1
+            stats.histogram[bisect_left(self.buckets, seconds)] += 1
+            stats.seconds += seconds
+            stats.slowest = max(stats.slowest, seconds)
+            stats.bytes += size
+        self._emit({'event': 'request', 'method': key[0], 'endpoint': key[1], 'url': url, 'status': status,
+                    'seconds': seconds, 'bytes': size, 'attempt': attempt,
+                    'error': None if error is None else repr(error)})
+
+    def pagination(self, url, pages):
+        """
+        Records a paginated fetch that took the given number of pages.
+        """
+        key = ('GET', endpoint(url))
+        with self._lock:
+            stats = self._stats(key)
+            stats.paginations += 1
+            stats.pages += pages
+            stats.most_pages = max(stats.most_pages, pages)
+        self._emit({'event': 'pagination', 'method': key[0], 'endpoint': key[1], 'url': url, 'pages': pages})
+
+    def _emit(self, event):
+        for callback in list(self._callbacks):
+            callback(event)
+        if self.trace:
+            trace_logger.info(json.dumps(event))
+
+    def summary(self):
+        """
+        The statistics of every endpoint as a dictionary keyed on 'METHOD endpoint', slowest in total first.
+        """
+        with self._lock:
+            items = sorted(self.endpoints.items(), key=lambda item: item[1].seconds, reverse=True)
+            return {'{method} {endpoint}'.format(method=method, endpoint=path): stats.as_dict()
+                    for (method, path), stats in items}
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
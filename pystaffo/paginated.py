@@ -1,25 +1,124 @@
 import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from .decoding import decode
 
 PER_PAGE = 300
+WORKERS = 4
 
-def get(auth=None, url=None, extras=None):
+
+def _fetch(http, auth, url, params, page, fields=None):
+    """
+    GETs a single page, returning the response along with its decoded content, cut down to `fields` if they are given.
+    An unsuccessful response raises an HTTPError rather than having its error body returned as data.
+    """
+    page_params = dict(params)
+    page_params.update({'page': page})
+    r = http.get(url=url, auth=auth, params=page_params)
+    r.raise_for_status()
+    return r, decode(r.content, fields)
+
+
+def _last_page(r, per_page):
+    """
+    Works out the number of the last page from the Total header, or failing that from the Link header's last url.
+    Returns None if the response does not say how much data exists.
+    """
+    if 'Total' in r.headers:
+        return -(-int(r.headers['Total']) // per_page)
+    if 'last' in r.links:
+        query = parse_qs(urlparse(str(r.links['last']['url'])).query)
+        if 'page' in query:
+            return int(query['page'][0])
+    return None
+
+
+def _paginated(http, url, pages):
+    """
+    Records the number of pages a paginated fetch took with the session's metrics, if it has any.
+    """
+    metrics = getattr(http, 'metrics', None)
+    if metrics is not None:
+        metrics.pagination(url, pages)
+
+
+def get(auth=None, url=None, extras=None, session=None, workers=WORKERS, fields=None):
     """
     Paginated GET
+    If a session is given its pooled connections are used for every page, otherwise each page opens its own.
+    Once the first page's headers show how many pages exist, the rest are fetched concurrently by up to `workers`
+    threads and joined back together in page order. A first page shorter than a full page is returned straight away.
+    With fields, only those fields of each record are kept.
     """
-    page = 1
-    params = {'page': page, 'per_page': PER_PAGE}
+    http = session or requests
+    params = {'per_page': PER_PAGE}
     if extras: params.update(extras)
-    r = requests.get(url=url, auth=auth, params=params)
-    data = json.loads(r.content.decode('utf-8'))
+    r, data = _fetch(http, auth, url, params, 1, fields)
+    per_page = int(r.headers.get('Per-Page', PER_PAGE))
+    if (not isinstance(data, list)) or len(data) < per_page:
+        _paginated(http, url, 1)
+        return data
+    last_page = _last_page(r, per_page)
+    if last_page is not None:
+        if last_page > 1:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                pages = pool.map(lambda page: _fetch(http, auth, url, params, page, fields)[1],
+                                 range(2, last_page + 1))
+                for response in pages:
+                    data += response
+        _paginated(http, url, max(1, last_page))
+        return data
+    page = 1
     keep_going = True
     while keep_going:
         page += 1
-        params.update({'page': page})
-        r = requests.get(url=url, auth=auth, params=params)
-        response = json.loads(r.content.decode('utf-8'))
+        r, response = _fetch(http, auth, url, params, page, fields)
         if (not response) or ('Page' not in r.headers):
             keep_going = False
         else:
             data += response
+            keep_going = len(response) >= per_page
+    _paginated(http, url, page)
     return data
+
+
+def get_one(auth=None, url=None, extras=None, session=None, fields=None):
+    """
+    GET of a single resource, such as locations/1.json, made as one request without pagination parameters.
+    An unsuccessful response raises an HTTPError.
+    """
+    r = (session or requests).get(url=url, auth=auth, params=extras)
+    r.raise_for_status()
+    return decode(r.content, fields)
+
+
+def iterate(auth=None, url=None, extras=None, session=None, prefetch=True, fields=None):
+    """
+    Paginated GET as a generator, yielding the records one page at a time so that the whole collection is never held
+    in memory. With prefetch, the next page is requested in the background while the current page is being consumed.
+    """
+    http = session or requests
+    params = {'per_page': PER_PAGE}
+    if extras: params.update(extras)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        r, response = _fetch(http, auth, url, params, 1, fields)
+        if not isinstance(response, list):
+            yield response
+            return
+        per_page = int(r.headers.get('Per-Page', PER_PAGE))
+        last_page = _last_page(r, per_page)
+        page = 1
+        try:
+            while True:
+                more = len(response) >= per_page and (last_page is None or page < last_page)
+                upcoming = pool.submit(_fetch, http, auth, url, params, page + 1, fields) if more and prefetch else None
+                for record in response:
+                    yield record
+                if not more:
+                    return
+                page += 1
+                r, response = upcoming.result() if upcoming else _fetch(http, auth, url, params, page, fields)
+                if (not response) or ('Page' not in r.headers):
+                    return
+        finally:
+            _paginated(http, url, page)
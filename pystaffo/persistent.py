@@ -0,0 +1,62 @@
+"""
+Persistent keeps an account's timezone, location mapping and department mapping in a local SQLite file, keyed by
+subdomain, so that new processes can skip re-downloading them until they are older than the time-to-live.
+"""
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.pystaffo', 'metadata.sqlite')
+TTL = 24 * 60 * 60
+
+
+class MetadataCache:
+    def __init__(self, path=DEFAULT_PATH, ttl=TTL):
+        """
+        path is the SQLite file to use, created if need be, and ttl the number of seconds an entry stays valid for.
+        """
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._execute('CREATE TABLE IF NOT EXISTS metadata (subdomain TEXT, key TEXT, value TEXT, saved_at REAL, '
+                      'PRIMARY KEY (subdomain, key))')
+
+    def _execute(self, sql, parameters=()):
+        """
+        Runs one statement on its own connection, which keeps the cache safe to share between threads and processes,
+        and returns the first row of the result.
+        """
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                return connection.execute(sql, parameters).fetchone()
+        finally:
+            connection.close()
+
+    def load(self, subdomain, key):
+        """
+        Returns the value stored for the subdomain under key, or None if there is none or it has expired.
+        """
+        row = self._execute('SELECT value, saved_at FROM metadata WHERE subdomain = ? AND key = ?', (subdomain, key))
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def save(self, subdomain, key, value):
+        """
+        Stores a JSON serialisable value for the subdomain under key.
+        """
+        self._execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)',
+                      (subdomain, key, json.dumps(value), time.time()))
+
+    def invalidate(self, subdomain, key=None):
+        """
+        Removes the subdomain's entry for key, or all of its entries if no key is given.
+        """
+        if key is None:
+            self._execute('DELETE FROM metadata WHERE subdomain = ?', (subdomain,))
+        else:
+            self._execute('DELETE FROM metadata WHERE subdomain = ? AND key = ?', (subdomain, key))
@@ -0,0 +1,109 @@
+"""
+An AccountPool holds a StaffoAccount for each of many subdomains. The accounts share one pooled session, so that
+connections to the API are reused across all of them, but each keeps its own rate limit and number of workers.
+Their metadata is bootstrapped concurrently. Calls can be fanned out over every account at once, with their records
+merged and tagged with the subdomain they came from.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from .bulk import Result
+from .paginated import WORKERS
+from .pooled import make_session, POOL_MAXSIZE
+from .scheduler import TokenBucket, RATE, BURST
+from .staffo import StaffoAccount
+
+CONCURRENCY = 8
+
+
+class AccountPool:
+    def __init__(self, credentials, concurrency=CONCURRENCY, workers=WORKERS, rate=RATE, burst=BURST,
+                 pool_maxsize=None, **kwargs):
+        """
+        credentials is an iterable of (subdomain, username, password) tuples or of dictionaries with those keys, where
+        a dictionary may also give the account its own workers, rate and burst in place of the pool's defaults.
+        concurrency is the number of accounts called at once. Any other keyword arguments, e.g. metadata_cache or
+        metrics, are passed to every StaffoAccount.
+        The shared session keeps up to pool_maxsize connections, by default enough for every account called at once to
+        use all its workers. It accepts no cookies, so none can pass from one account to another.
+        """
+        self.concurrency = concurrency
+        self.session = make_session(pool_maxsize=pool_maxsize or max(POOL_MAXSIZE, concurrency * workers))
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.accounts = {}
+        for entry in credentials:
+            if not isinstance(entry, dict):
+                entry = dict(zip(('subdomain', 'username', 'password'), entry))
+            self.accounts[entry['subdomain']] = StaffoAccount(
+                entry['subdomain'], entry.get('username'), entry.get('password'), session=self.session,
+                workers=entry.get('workers', workers),
+                rate_limiter=TokenBucket(rate=entry.get('rate', rate), burst=entry.get('burst', burst)), **kwargs)
+
+    def __getitem__(self, subdomain):
+        return self.accounts[subdomain]
+
+    def __iter__(self):
+        return iter(self.accounts.values())
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the shared session's connections.
+        """
+        self.session.close()
+
+    def map(self, call, subdomains=None):
+        """
+        Calls call(account) for every account, or those of the given subdomains, up to `concurrency` at a time.
+        Returns a dictionary of subdomains to bulk.Results holding each call's return value or the error it raised.
+        """
+        subdomains = list(self.accounts if subdomains is None else subdomains)
+
+        def attempt(subdomain):
+            try:
+                return Result(subdomain, call(self.accounts[subdomain]), None)
+            except Exception as error:
+                return Result(subdomain, None, error)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+            return dict(zip(subdomains, pool.map(attempt, subdomains)))
+
+    def bootstrap(self, subdomains=None):
+        """
+        Loads the timezone, locations and departments of every account concurrently. Returns a dictionary of the
+        subdomains that failed to their errors.
+        """
+        results = self.map(lambda account: (account.timezone, account.departments), subdomains)
+        return {subdomain: result.error for subdomain, result in results.items() if result.error is not None}
+
+    def fan_out(self, method, subdomains=None, **kwargs):
+        """
+        Calls the named StaffoAccount method with the keyword arguments on every account at once and merges the
+        records returned into one list, each a copy tagged with the 'subdomain' it came from. If any account fails,
+        the first error (in subdomain order) is raised; use map to handle failures account by account.
+        """
+        results = self.map(lambda account: getattr(account, method)(**kwargs), subdomains)
+        for result in results.values():
+            if result.error is not None:
+                raise result.error
+        return [dict(record, subdomain=subdomain) for subdomain, result in results.items()
+                for record in result.response]
+
+    def get_shifts(self, subdomains=None, **kwargs):
+        """
+        get_shifts on every account, e.g. pool.get_shifts(start_date='2019-01-01', end_date='2019-01-31').
+        """
+        return self.fan_out('get_shifts', subdomains=subdomains, **kwargs)
+
+    def get_events(self, subdomains=None, **kwargs):
+        return self.fan_out('get_events', subdomains=subdomains, **kwargs)
+
+    def get_all_users(self, subdomains=None, **kwargs):
+        return self.fan_out('get_all_users', subdomains=subdomains, **kwargs)
@@ -0,0 +1,25 @@
+"""
+Pooled builds the requests session shared by every call a StaffoAccount makes, so that connections to the API are
+kept alive and reused rather than opened afresh for every page and every write.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 10
+
+
+def make_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=False, keep_alive=True):
+    """
+    Returns a requests.Session with a connection-pooling adapter mounted for both http and https.
+    pool_connections is the number of hosts to keep pools for and pool_maxsize the number of connections kept per host;
+    with pool_block set, callers wait for a free connection rather than opening extra, unpooled ones.
+    If keep_alive is False the server is asked to close each connection after its response.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers.update({'Connection': 'close'})
+    return session
@@ -0,0 +1,198 @@
+"""
+Compact forms for large numbers of shifts and events: record objects with __slots__ and their datetimes already parsed,
+or a columnar Table whose numeric and datetime columns are packed into typed arrays. A Table can be exported to CSV, or
+to NumPy, pyarrow or Parquet when those are installed.
+"""
+import csv
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from .dates import parse
+
+
+class Record:
+    __slots__ = ()
+    # Fields holding ISO 8601 timestamps, parsed to datetimes.
+    datetimes = ()
+    # Fields holding lists, kept as tuples.
+    sequences = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            value = data.get(name)
+            if value is not None and name in cls.datetimes:
+                value = parse(value)
+            elif value is not None and name in cls.sequences:
+                value = tuple(value)
+            setattr(record, name, value)
+        return record
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return '{cls}(id={id})'.format(cls=type(self).__name__, id=getattr(self, 'id', None))
+
+
+class Shift(Record):
+    __slots__ = ('id', 'location_id', 'department_id', 'schedule_id', 'starts_at', 'ends_at', 'desired_coverage',
+                 'assigned_user_ids', 'note', 'created_at', 'updated_at')
+    datetimes = ('starts_at', 'ends_at', 'created_at', 'updated_at')
+    sequences = ('assigned_user_ids',)
+
+    @property
+    def hours(self):
+        return (self.ends_at - self.starts_at).total_seconds() / 3600
+
+
+class Event(Record):
+    __slots__ = ('id', 'event_type', 'delivery_state', 'eventable_type', 'eventable_id', 'user_id', 'location_id',
+                 'created_at', 'updated_at')
+    datetimes = ('created_at', 'updated_at')
+
+
+class Table:
+    """
+    Columns of records. Datetime columns are held as float POSIX timestamps and whole-number columns as 64-bit
+    integers, each in an array; any other column (or one with gaps) is a plain list.
+    """
+    def __init__(self, columns, datetimes=()):
+        self.columns = columns
+        self.datetimes = tuple(datetimes)
+
+    @classmethod
+    def from_records(cls, records, kind):
+        """
+        Builds a table of the fields of kind (Shift or Event) from an iterable of API dictionaries, which may be a
+        stream, so the dictionaries need not all be held at once.
+        """
+        builder = TableBuilder(kind)
+        for data in records:
+            builder.add(data)
+        return builder.build()
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        """
+        Yields each row as a dictionary, with datetimes as UTC datetime objects.
+        """
+        names = list(self.columns)
+        for values in zip(*(self.columns[name] for name in names)):
+            row = dict(zip(names, values))
+            for name in self.datetimes:
+                if row.get(name) is not None:
+                    row[name] = datetime.fromtimestamp(row[name], tz=timezone.utc)
+            yield row
+
+    def hours(self):
+        """
+        The length in hours of each row, for tables with starts_at and ends_at columns.
+        """
+        return array('d', ((end - start) / 3600 for start, end in zip(self['starts_at'], self['ends_at'])))
+
+    def sum_by(self, key, values):
+        """
+        Sums a sequence of values (e.g. hours()) grouped by a column; rows with several keys in a sequence column,
+        such as assigned_user_ids, count towards each of them.
+        """
+        totals = defaultdict(float)
+        for keys, value in zip(self[key], values):
+            for group in keys if isinstance(keys, tuple) else (keys,):
+                totals[group] += value
+        return dict(totals)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(list(self.columns))
+            for row in self.rows():
+                writer.writerow([' '.join(map(str, value)) if isinstance(value, tuple) else
+                                 value.isoformat() if isinstance(value, datetime) else value
+                                 for value in row.values()])
+
+    def to_numpy(self):
+        """
+        A dictionary of NumPy arrays, sharing memory with the typed columns. Requires numpy.
+        """
+        import numpy
+        return {name: numpy.frombuffer(values, dtype=numpy.float64 if values.typecode == 'd' else numpy.int64)
+                if isinstance(values, array) else numpy.array(values, dtype=object)
+                for name, values in self.columns.items()}
+
+    def to_arrow(self):
+        """
+        A pyarrow.Table, with datetime columns as UTC timestamps. Requires pyarrow.
+        """
+        import pyarrow
+        arrays, names = [], []
+        for name, values in self.columns.items():
+            if name in self.datetimes:
+                values = [None if value is None else int(value * 1e6) for value in values]
+                arrays.append(pyarrow.array(values, type=pyarrow.timestamp('us', tz='UTC')))
+            else:
+                arrays.append(pyarrow.array([list(value) if isinstance(value, tuple) else value for value in values]))
+            names.append(name)
+        return pyarrow.Table.from_arrays(arrays, names=names)
+
+    def to_parquet(self, path):
+        """
+        Writes the table to a Parquet file. Requires pyarrow.
+        """
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(self.to_arrow(), path)
+
+
+class TableBuilder:
+    """
+    Accumulates API dictionaries a row at a time into the columns of a Table.
+    """
+    def __init__(self, kind):
+        self.kind = kind
+        self.columns = {name: [] for name in kind.__slots__}
+
+    def add(self, data):
+        for name in self.kind.__slots__:
+            value = data.get(name)
+            if value is not None and name in self.kind.datetimes:
+                value = parse(value).timestamp()
+            elif value is not None and name in self.kind.sequences:
+                value = tuple(value)
+            self.columns[name].append(value)
+
+    def build(self):
+        """
+        Packs the columns that allow it into typed arrays and returns the Table.
+        """
+        columns = {}
+        for name, values in self.columns.items():
+            if values and name in self.kind.datetimes and None not in values:
+                columns[name] = array('d', values)
+            elif values and all(type(value) is int for value in values):
+                columns[name] = array('q', values)
+            else:
+                columns[name] = values
+        return Table(columns, datetimes=self.kind.datetimes)
+
+
+def compact(records, kind, form, stream=False):
+    """
+    Turns API dictionaries into the compact form: 'records' for kind objects (a generator of them with stream) or
+    'table' for a Table.
+    """
+    if form == 'table':
+        return Table.from_records(records, kind)
+    if form == 'records':
+        objects = (kind.from_dict(data) for data in records)
+        return objects if stream else list(objects)
+    raise ValueError("compact must be 'records' or 'table'")
@@ -0,0 +1,149 @@
+"""
+A Registry holds an account's locations and departments with forward (name to id) and reverse (id to name, department
+to location) indexes, all updated in place as locations and departments are created and renamed, so that lookups and
+changes cost the same however large the account is.
+Its locations and departments views read like the plain dictionaries the account used to hold:
+locations[loc_name] is a location id and departments[loc_name][dep_name] a department id.
+"""
+from collections.abc import Mapping
+
+
+class _Locations(Mapping):
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getitem__(self, loc_name):
+        return self._registry._location_ids[loc_name]
+
+    def __iter__(self):
+        return iter(self._registry._location_ids)
+
+    def __len__(self):
+        return len(self._registry._location_ids)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _LocationDepartments(Mapping):
+    def __init__(self, registry, location_id):
+        self._registry = registry
+        self._location_id = location_id
+
+    def _ids(self):
+        return self._registry._department_ids.get(self._location_id, {})
+
+    def __getitem__(self, dep_name):
+        return self._ids()[dep_name]
+
+    def __iter__(self):
+        return iter(self._ids())
+
+    def __len__(self):
+        return len(self._ids())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _Departments(Mapping):
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getitem__(self, loc_name):
+        return _LocationDepartments(self._registry, self._registry._location_ids[loc_name])
+
+    def __iter__(self):
+        return iter(self._registry._location_ids)
+
+    def __len__(self):
+        return len(self._registry._location_ids)
+
+    def __repr__(self):
+        return repr({loc_name: dict(departments) for loc_name, departments in self.items()})
+
+
+class Registry:
+    def __init__(self, locations=None, departments=None):
+        """
+        locations is a location name-id mapping and departments a mapping of location names to department name-id
+        mappings, as held by the metadata cache.
+        """
+        self._location_ids = {}
+        self._location_names = {}
+        self._department_ids = {}
+        self._department_locations = {}
+        self._department_names = {}
+        self.locations = _Locations(self)
+        self.departments = _Departments(self)
+        for loc_name, location_id in (locations or {}).items():
+            self.add_location(location_id, loc_name)
+        if departments is not None:
+            self.set_departments(departments)
+
+    def set_departments(self, departments):
+        """
+        Replaces the departments with those of a mapping of location names to department name-id mappings.
+        """
+        self._department_ids = {}
+        self._department_locations = {}
+        self._department_names = {}
+        for loc_name, location_departments in departments.items():
+            for dep_name, department_id in location_departments.items():
+                self.add_department(self._location_ids[loc_name], department_id, dep_name)
+
+    def location_name(self, location_id):
+        return self._location_names[location_id]
+
+    def department_name(self, department_id):
+        """
+        The name of a department by its id, which is unambiguous even where locations have departments of the same name.
+        """
+        return self._department_names[department_id]
+
+    def department_location(self, department_id):
+        """
+        The id of the location a department belongs to.
+        """
+        return self._department_locations[department_id]
+
+    def add_location(self, location_id, loc_name):
+        self._location_ids[loc_name] = location_id
+        self._location_names[location_id] = loc_name
+        self._department_ids.setdefault(location_id, {})
+
+    def rename_location(self, location_id, loc_name):
+        old_name = self._location_names.get(location_id)
+        if old_name is None:
+            return self.add_location(location_id, loc_name)
+        del self._location_ids[old_name]
+        self._location_ids[loc_name] = location_id
+        self._location_names[location_id] = loc_name
+
+    def add_department(self, location_id, department_id, dep_name):
+        self._department_ids.setdefault(location_id, {})[dep_name] = department_id
+        self._department_locations[department_id] = location_id
+        self._department_names[department_id] = dep_name
+
+    def rename_department(self, department_id, dep_name):
+        """
+        Renames a department by its id; departments not in the registry are left for the next load to pick up.
+        """
+        location_id = self._department_locations.get(department_id)
+        if location_id is None:
+            return
+        del self._department_ids[location_id][self._department_names[department_id]]
+        self.add_department(location_id, department_id, dep_name)
+
+    def location_mapping(self):
+        """
+        The locations as a plain name-id dictionary.
+        """
+        return dict(self._location_ids)
+
+    def department_mapping(self):
+        """
+        The departments as a plain dictionary of location names to department name-id dictionaries.
+        """
+        return {loc_name: dict(self._department_ids.get(location_id, {}))
+                for loc_name, location_id in self._location_ids.items()}
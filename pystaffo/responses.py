@@ -0,0 +1,103 @@
+"""
+An opt-in read-through cache for GET responses, keyed on url and parameters, so that repeated identical reads are
+answered locally. Entries are kept in least-recently-used order up to a maximum number, each expires after the
+time-to-live for its endpoint, and expired entries are revalidated with If-None-Match/If-Modified-Since when the server
+supplied an ETag or Last-Modified header, so unchanged data only costs a 304.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlparse
+
+MAXSIZE = 256
+TTL = 60
+
+
+def resource(url):
+    """
+    Returns the name of the resource a url refers to, e.g. 'shifts' for both .../locations/1/shifts.json and
+    .../shifts/2.json.
+    """
+    parts = [part[:-5] if part.endswith('.json') else part for part in urlparse(url).path.split('/') if part]
+    while parts and parts[-1].isdigit():
+        parts.pop()
+    return parts[-1] if parts else ''
+
+
+class ResponseCache:
+    def __init__(self, maxsize=MAXSIZE, ttl=TTL, ttls=None):
+        """
+        maxsize is the number of responses kept, ttl the default number of seconds they stay fresh for and ttls a
+        dictionary of resource names (e.g. 'shifts') to their own number of seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, response):
+        with self._lock:
+            self._entries[key] = [response, time.monotonic()]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def fetch(self, session, url=None, auth=None, params=None, **kwargs):
+        """
+        GETs url through session unless a fresh response for the same url and parameters is held.
+        """
+        key = (url, tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                                 for name, value in (params or {}).items())))
+        entry = self._lookup(key)
+        if entry is not None:
+            cached, saved_at = entry
+            if time.monotonic() - saved_at < self.ttls.get(resource(url), self.ttl):
+                return cached
+            headers = dict(kwargs.pop('headers', None) or {})
+            if 'ETag' in cached.headers:
+                headers.update({'If-None-Match': cached.headers['ETag']})
+            if 'Last-Modified' in cached.headers:
+                headers.update({'If-Modified-Since': cached.headers['Last-Modified']})
+            if headers:
+                kwargs.update({'headers': headers})
+        r = session.get(url=url, auth=auth, params=params, **kwargs)
+        if r.status_code == 304 and entry is not None:
+            self._store(key, entry[0])
+            return entry[0]
+        if r.status_code == 200:
+            self._store(key, r)
+        return r
+
+    def invalidate(self, name=None):
+        """
+        Drops the responses of the named resource, or every response if no name is given.
+        """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if resource(key[0]) == name]:
+                del self._entries[key]
+
+
+class CachingSession:
+    """
+    Wraps a session so that its GETs go through a ResponseCache, with everything else passed straight through.
+    """
+    def __init__(self, session, cache):
+        self.session = session
+        self.cache = cache
+
+    def get(self, url=None, **kwargs):
+        return self.cache.fetch(self.session, url=url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
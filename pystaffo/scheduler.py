@@ -0,0 +1,146 @@
+"""
+The scheduler sits between a StaffoAccount and its session. Every request first takes a token from a token bucket, so
+that all the threads (and, if they share a bucket, all the accounts) making calls stay within the API's rate limit
+together, and requests that are throttled or fail transiently are retried after an exponential backoff with jitter,
+or after the server's Retry-After when it gives one.
+Given a metrics.Metrics, the scheduler records every attempt at a request with it.
+"""
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+import requests
+
+RATE = 10.0
+BURST = 10
+MAX_RETRIES = 5
+BACKOFF = 0.5
+MAX_BACKOFF = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate=RATE, burst=BURST):
+        """
+        rate is the number of requests allowed per second on average and burst the number that may be made at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._resume = 0.0
+        self._lock = Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns the number of seconds the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._resume - now)
+
+    def pause(self, seconds):
+        """
+        Holds back every caller for the given number of seconds, e.g. after the server has asked for a pause.
+        """
+        with self._lock:
+            self._resume = max(self._resume, time.monotonic() + seconds)
+
+
+def retryable(method, status):
+    """
+    Whether a response with this status should be retried. POSTs are not idempotent, so they are only retried when they
+    were turned away by the rate limit, and so were never acted on.
+    """
+    if method.upper() == 'POST':
+        return status == 429
+    return status in RETRY_STATUSES
+
+
+def retry_after(value):
+    """
+    Converts a Retry-After header, in seconds or as an HTTP date, to a number of seconds, or None if there is none.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff(attempt, wait=None, base=BACKOFF, cap=MAX_BACKOFF):
+    """
+    The number of seconds to wait before retry number attempt + 1: the server's wait if it gave one, otherwise a
+    random time up to an exponentially growing limit ("full jitter").
+    """
+    if wait is not None:
+        return min(wait, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RequestScheduler:
+    def __init__(self, session, rate_limiter=None, max_retries=MAX_RETRIES, base=BACKOFF, cap=MAX_BACKOFF,
+                 metrics=None):
+        """
+        Wraps a session. rate_limiter is the TokenBucket to draw from, which may be shared with other schedulers.
+        """
+        self.session = session
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.metrics = metrics
+
+    def request(self, method, url, **kwargs):
+        """
+        Makes a request once the rate limit allows, retrying it up to max_retries times. The last response is returned
+        whatever its status; connection errors are raised once the retries are used up, or at once for a POST, which the
+        server may already have acted on.
+        """
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+                if self.metrics is not None:
+                    self.metrics.request(method, url, seconds=time.perf_counter() - started, attempt=attempt,
+                                         error=error)
+                if method.upper() == 'POST' or attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff(attempt, base=self.base, cap=self.cap))
+                attempt += 1
+                continue
+            if self.metrics is not None:
+                self.metrics.request(method, url, status=response.status_code, seconds=time.perf_counter() - started,
+                                     size=len(response.content), attempt=attempt)
+            if attempt >= self.max_retries or not retryable(method, response.status_code):
+                return response
+            delay = backoff(attempt, retry_after(response.headers.get('Retry-After')), base=self.base, cap=self.cap)
+            if response.status_code == 429:
+                self.rate_limiter.pause(delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url=None, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def put(self, url=None, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def post(self, url=None, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
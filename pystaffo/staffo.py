@@ -1,143 +1,389 @@
 """
 A StaffoAccount instance is created for a given account, and its methods make calls to the Staffomatic API.
-Caching is used to avoid repeat calls for the location name-id mappings and department name-id mappings.
+Caching is used to avoid repeat calls for the location name-id mappings and department name-id mappings, which are
+only fetched the first time they are needed.
+All calls share one pooled, keep-alive session; the account can be used as a context manager to close it afterwards.
+Every call is made through a scheduler that keeps to the API's rate limit and retries throttled and failed requests,
+and which records each request with the account's metrics.Metrics, if it is given one.
 """
 
+import pytz
 import requests
-import json
-from datetime import datetime
-from .paginated import get
+from threading import RLock
+from concurrent.futures import ThreadPoolExecutor
+from .paginated import get, get_one, iterate, WORKERS
 from .cached import get_timezone, get_location_mapping, get_department_mapping
+from .pooled import make_session, POOL_CONNECTIONS, POOL_MAXSIZE
+from .responses import CachingSession, resource
+from .bulk import run
+from .scheduler import RequestScheduler, MAX_RETRIES
+from .dates import windows, unique, TimeConverter
+from . import incremental, membership
+from .records import Shift, Event, compact
+from .registry import Registry
+from .decoding import decode
+
+API_URL = 'https://api.staffomaticapp.com/v3/'
+
+# The resources that can be fetched one record at a time by id, with get_many.
+SINGLE_RESOURCES = ('locations', 'departments', 'schedules', 'shifts', 'users', 'applications')
+
+# Writes to these endpoints change the data of another resource, whose cached responses they invalidate.
+WRITTEN_RESOURCES = {'add_users': 'users', 'remove_users': 'users', 'assign': 'shifts'}
 
 
 class StaffoAccount:
-    def __init__(self, subdomain=None, username=None, password=None):
+    def __init__(self, subdomain=None, username=None, password=None, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, pool_block=False, keep_alive=True, workers=WORKERS,
+                 prefetch=True, metadata_cache=None, response_cache=None, rate_limiter=None, max_retries=MAX_RETRIES,
+                 metrics=None, api_url=API_URL, session=None):
+        """
+        session may be a requests.Session to share with other accounts (see pool.AccountPool), in which case the pool
+        arguments are ignored and closing the account leaves the session open.
+        """
         self.auth = (username, password)
-        self.base_url = 'https://api.staffomaticapp.com/v3/{subdomain}/'.format(subdomain=subdomain)
-        self.timezone = get_timezone(self.auth, self.base_url)
-        self.locations = get_location_mapping(self.auth, self.base_url)
-        self.departments = get_department_mapping(self.auth, self.base_url)
+        self.subdomain = subdomain
+        self.base_url = '{api_url}{subdomain}/'.format(api_url=api_url, subdomain=subdomain)
+        self._owns_session = session is None
+        self.session = session or make_session(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                               pool_block=pool_block, keep_alive=keep_alive)
+        self.scheduler = RequestScheduler(self.session, rate_limiter=rate_limiter, max_retries=max_retries,
+                                          metrics=metrics)
+        self.metrics = metrics
+        self.response_cache = response_cache
+        self._http = CachingSession(self.scheduler, response_cache) if response_cache is not None else self.scheduler
+        self.workers = workers
+        self.prefetch = prefetch
+        self.metadata_cache = metadata_cache
+        self._lock = RLock()
+        self._timezone = None
+        self._registry = None
+        self._departments = None
+        self._times = None
+
+    @property
+    def times(self):
+        """
+        The dates.TimeConverter for the account's timezone, which all date and time parameters are formatted with.
+        """
+        if self._times is None or self._times.timezone is not self.timezone:
+            self._times = TimeConverter(self.timezone)
+        return self._times
+
+    @property
+    def timezone(self):
+        """
+        The account's timezone as a pytz.timezone, fetched the first time it is needed.
+        """
+        return self._cached('_timezone', lambda: pytz.timezone(self._stored('timezone', lambda: get_timezone(
+            self.auth, self.base_url, session=self._http).zone)))
+
+    @timezone.setter
+    def timezone(self, timezone):
+        self._timezone = timezone
+
+    @property
+    def registry(self):
+        """
+        The registry.Registry of the account's locations, fetched the first time it is needed, and of its departments
+        once they have been.
+        """
+        return self._cached('_registry', lambda: Registry(self._stored('locations', lambda: get_location_mapping(
+            self.auth, self.base_url, session=self._http))))
+
+    @property
+    def locations(self):
+        """
+        The location name-id mapping, fetched the first time it is needed.
+        """
+        return self.registry.locations
+
+    @property
+    def departments(self):
+        """
+        The department name-id mappings of each location, fetched the first time they are needed.
+        """
+        return self._cached('_departments', lambda: self._load_departments(self._stored(
+            'departments', self._fetch_departments)))
+
+    def _fetch_departments(self):
+        return get_department_mapping(self.auth, self.base_url, session=self._http,
+                                      locations=self.registry.location_mapping(), workers=self.workers)
+
+    def _load_departments(self, departments):
+        """
+        Loads a department mapping into the registry. The locations and departments are kept in the metadata cache
+        separately, so a stored mapping whose locations differ from the registry's (e.g. because the locations have
+        since expired and been fetched again with one renamed) is stale, and is fetched afresh and stored instead.
+        """
+        if set(departments) != set(self.registry.locations):
+            departments = self._fetch_departments()
+            if self.metadata_cache is not None:
+                self.metadata_cache.save(self.subdomain, 'departments', departments)
+        self.registry.set_departments(departments)
+        return self.registry.departments
+
+    def _cached(self, attribute, load):
+        """
+        Returns the cached attribute, loading it first if this is the first time it is needed.
+        """
+        if getattr(self, attribute) is None:
+            with self._lock:
+                if getattr(self, attribute) is None:
+                    setattr(self, attribute, load())
+        return getattr(self, attribute)
+
+    def _stored(self, key, fetch):
+        """
+        Returns the value kept under key in the metadata cache, if there is one and it is fresh, otherwise fetches it
+        and stores it there.
+        """
+        if self.metadata_cache is None:
+            return fetch()
+        value = self.metadata_cache.load(self.subdomain, key)
+        if value is None:
+            value = fetch()
+            self.metadata_cache.save(self.subdomain, key, value)
+        return value
+
+    def _store_mappings(self):
+        """
+        Writes the location and department mappings back to the metadata cache after they have been changed.
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.save(self.subdomain, 'locations', self.registry.location_mapping())
+            if self._departments is not None:
+                self.metadata_cache.save(self.subdomain, 'departments', self.registry.department_mapping())
+
+    def invalidate_metadata(self):
+        """
+        Forgets the cached timezone, locations and departments, both on the instance and in the metadata cache, so
+        that they are fetched afresh the next time they are needed.
+        """
+        with self._lock:
+            self._timezone = None
+            self._registry = None
+            self._departments = None
+            if self.metadata_cache is not None:
+                self.metadata_cache.invalidate(self.subdomain)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the pooled connections held by the account's session, unless the session is shared.
+        """
+        if self._owns_session:
+            self.session.close()
+
+    def _get(self, extension, extras=None, stream=False, fields=None):
+        """
+        Paginated GET of an endpoint relative to the account's base url, over the account's session (and through the
+        response cache, if there is one).
+        With stream set, a generator of the records is returned instead of a list; with fields, only those fields of
+        each record are kept.
+        """
+        if stream:
+            return iterate(auth=self.auth, url=self.base_url + extension, extras=extras, session=self._http,
+                           prefetch=self.prefetch, fields=fields)
+        return get(auth=self.auth, url=self.base_url + extension, extras=extras, session=self._http,
+                   workers=self.workers, fields=fields)
+
+    def _get_one(self, extension, extras=None, fields=None):
+        """
+        GET of a single resource relative to the account's base url, without pagination.
+        """
+        return get_one(auth=self.auth, url=self.base_url + extension, extras=extras, session=self._http, fields=fields)
+
+    def _put(self, extension, params):
+        response = self._http.put(auth=self.auth, url=self.base_url + extension, json=params)
+        self._written(extension)
+        return response
+
+    def _post(self, extension, params):
+        response = self._http.post(auth=self.auth, url=self.base_url + extension, json=params)
+        self._written(extension)
+        return response
+
+    def _written(self, extension):
+        """
+        Drops the cached responses of the resource a write has changed.
+        """
+        if self.response_cache is not None:
+            name = resource(extension)
+            self.response_cache.invalidate(WRITTEN_RESOURCES.get(name, name))
+
+    def _dated(self, extension, params, start_date, end_date=None, shard=None, stream=False, fields=None):
+        """
+        GETs an endpoint filtered from start_date until end_date. With shard the range is split into windows
+        (see dates.windows) which are fetched up to the account's number of workers at a time, or one after another
+        when streaming, and the records are merged in date order without duplicates.
+        """
+        if not shard:
+            params = dict(params, **self.times.range_params(start_date, end_date))
+            return self._get(extension, extras=params, stream=stream, fields=fields)
+        extras = [dict(params, **self.times.range_params(start, end))
+                  for start, end in windows(start_date, end_date or self.times.today(), shard)]
+        if stream:
+            return unique(record for window in extras
+                          for record in self._get(extension, extras=window, stream=True, fields=fields))
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            results = pool.map(lambda window: self._get(extension, extras=window, fields=fields), extras)
+            return list(unique(record for result in results for record in result))
+
+    def _compact(self, records, kind, form, stream):
+        """
+        Converts fetched records to a compact form, see records.compact.
+        """
+        return compact(records, kind, form, stream=stream)
+
+    def _then(self, response, callback):
+        """
+        Passes the decoded content of a successful write response to callback, which keeps the cached mappings in
+        step with the account, and returns the response.
+        """
+        if response.status_code == 200:
+            callback(decode(response.content))
+        return response
 
     def get_locations(self):
         """
         Gets the information of all the locations in an account.
         """
-        return get(auth=self.auth, url=self.base_url + 'locations.json')
+        return self._get('locations.json')
 
     def get_location(self, location_id=None, loc_name=None):
         """
         Gets the information for a specified location, specified by its id or name.
         """
         if location_id:
-            return get(auth=self.auth, url=self.base_url + 'locations/{id}.json'.format(id=location_id))
+            return self._get_one('locations/{id}.json'.format(id=location_id))
         else:
             location_id = self.locations[loc_name]
-            return get(auth=self.auth, url=self.base_url + 'locations/{id}.json'.format(id=location_id))
+            return self._get_one('locations/{id}.json'.format(id=location_id))
 
     def get_departments(self):
         """
         Gets the information of all the departments in an account.
         """
-        return get(auth=self.auth, url=self.base_url + 'departments.json')
+        return self._get('departments.json')
 
     def get_department(self, department_id=None, loc_name=None, dep_name=None):
         """
         Gets the information for a specified department, specified by its id or by its location and department names.
         """
         if department_id:
-            return get(auth=self.auth, url=self.base_url + 'departments/{dep_id}.json'.format(dep_id=department_id))
+            return self._get_one('departments/{dep_id}.json'.format(dep_id=department_id))
         else:
             department_id = self.departments[loc_name][dep_name]
-            return get(auth=self.auth, url=self.base_url + 'departments/{dep_id}.json'.format(dep_id=department_id))
+            return self._get_one('departments/{dep_id}.json'.format(dep_id=department_id))
 
-    def get_all_users(self, state=None):
+    def get_many(self, kind, ids, fields=None):
+        """
+        Fetches many records of one kind (one of SINGLE_RESOURCES, e.g. 'shifts' or 'users') by id, up to the
+        account's number of workers at a time, each id once however often it is given. Returns a dictionary of the ids
+        to their records, in the order first given; ids that do not exist map to None.
+        """
+        if kind not in SINGLE_RESOURCES:
+            raise ValueError('kind must be one of {kinds}'.format(kinds=', '.join(SINGLE_RESOURCES)))
+        ids = list(dict.fromkeys(ids))
+
+        def fetch(record_id):
+            try:
+                return self._get_one('{kind}/{id}.json'.format(kind=kind, id=record_id), fields=fields)
+            except requests.exceptions.HTTPError as error:
+                if error.response is None or error.response.status_code != 404:
+                    raise
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            return dict(zip(ids, pool.map(fetch, ids)))
+
+    def get_all_users(self, state=None, stream=False, fields=None):
         """
         Gets the information of all users, filterable by state of the users.
+        With stream set the users are yielded page by page rather than returned as a list.
+        fields, e.g. ('id', 'email'), keeps only those fields of each user.
         """
         extension = 'users.json'
         if not state:
-            return get(auth=self.auth, url=self.base_url + extension)
+            return self._get(extension, stream=stream, fields=fields)
         else:
-            return get(auth=self.auth, url=self.base_url + extension, extras={'state': state})
+            return self._get(extension, extras={'state': state}, stream=stream, fields=fields)
 
-    def get_loc_users(self, location_id=None, loc_name=None, dep_name=None):
+    def get_loc_users(self, location_id=None, loc_name=None, dep_name=None, stream=False, fields=None):
         """
         Gets the information of the users in a location specified by id or name. If dep_name is provided then the users
         are further filtered by the department name provided.
+        With stream set the users are yielded page by page rather than returned as a list.
+        fields, e.g. ('id', 'email'), keeps only those fields of each user.
         """
         if not location_id:
             location_id = self.locations[loc_name]
         extension = 'locations/{id}/users.json'.format(id=location_id)
         if not dep_name:
-            return get(auth=self.auth, url=self.base_url + extension)
+            return self._get(extension, stream=stream, fields=fields)
         else:
             department_id = self.departments[loc_name][dep_name]
-            return get(auth=self.auth, url=self.base_url + extension, extras={'department_ids': department_id})
+            return self._get(extension, extras={'department_ids': department_id}, stream=stream, fields=fields)
 
-    def get_schedules(self, schedule_id=None, start_date=None, end_date=None):
+    def get_schedules(self, schedule_id=None, start_date=None, end_date=None, shard=None):
         """
         Gets the schedules (for all locations). If the schedule id is specified then only that schedule is returned;
         if the start and end dates are specified then all schedules within those dates are returned: if no end date
         is provided then all schedules since the start date until now are returned.
-        Input dates expected to be date strings in yyyy-mm-dd format.
+        Input dates expected to be date strings in yyyy-mm-dd format, or date objects.
+        shard may be 'day', 'week', 'month' or a number of days, to split the date range into windows of that size
+        which are fetched at once.
         """
         extension = 'schedules'
         if schedule_id:
             extension += '/{id}.json'.format(id=schedule_id)
-            return get(auth=self.auth, url=self.base_url + extension)
+            return self._get_one(extension)
         elif start_date:
             extension += '.json'
-            start_tz = self.timezone.localize(datetime.strptime(start_date, '%Y-%m-%d'))
-            start_tz = datetime.strftime(start_tz, '%z')
-            start_tz = start_tz[:3] + ':' + start_tz[3:]
-            if not end_date:
-                end_tz = datetime.now(tz=self.timezone)
-            else:
-                end_tz = self.timezone.localize(datetime.strptime(end_date, '%Y-%m-%d'))
-            end_date = end_tz.strftime('%Y-%m-%d')
-            end_tz = end_tz.strftime('%z')
-            end_tz = end_tz[:3] + ':' + end_tz[3:]
-            params = {'from': '{st_date}T00:00:00{st_tz}'.format(st_date=start_date, st_tz=start_tz),
-                      'until': '{en_date}T23:59:59{en_tz}'.format(en_date=end_date, en_tz=end_tz)}
-            return get(auth=self.auth, url=self.base_url + extension, extras=params)
-
-    def get_loc_schedules(self, location_id=None, loc_name=None, start_date=None, end_date=None):
+            return self._dated(extension, {}, start_date, end_date, shard=shard)
+
+    def get_loc_schedules(self, location_id=None, loc_name=None, start_date=None, end_date=None, shard=None):
         """
         Gets the schedules for a given location.
         All schedules within between the start and end dates are returned: if no end date
         is provided then all schedules since the start date until now are returned.
-        Input dates expected to be date strings in yyyy-mm-dd format.
+        Input dates expected to be date strings in yyyy-mm-dd format, or date objects.
+        shard splits the date range into windows fetched at once, as for get_schedules.
         """
         if not location_id:
             location_id = self.locations[loc_name]
         extension = 'locations/{loc_id}/schedules.json'.format(loc_id=location_id)
-        start_tz = self.timezone.localize(datetime.strptime(start_date, '%Y-%m-%d'))
-        start_tz = datetime.strftime(start_tz, '%z')
-        start_tz = start_tz[:3] + ':' + start_tz[3:]
-        if not end_date:
-            end_tz = datetime.now(tz=self.timezone)
-        else:
-            end_tz = self.timezone.localize(datetime.strptime(end_date, '%Y-%m-%d'))
-        end_date = end_tz.strftime('%Y-%m-%d')
-        end_tz = end_tz.strftime('%z')
-        end_tz = end_tz[:3] + ':' + end_tz[3:]
-        params = {'from': '{st_date}T00:00:00{st_tz}'.format(st_date=start_date, st_tz=start_tz),
-                  'until': '{en_date}T23:59:59{en_tz}'.format(en_date=end_date, en_tz=end_tz)}
-        return get(auth=self.auth, url=self.base_url + extension, extras=params)
+        return self._dated(extension, {}, start_date, end_date, shard=shard)
 
     def get_shifts(self, location_id=None, loc_name=None, department_id=None, dep_name=None, schedule_id=None,
-                   start_date=None, end_date=None):
+                   start_date=None, end_date=None, stream=False, shard=None, compact=None, fields=None):
         """
         Gets the shifts for either a specified schedule (id number) or for a specified location where they may also be
         filtered for a date range or department.
         For filtering by location and department it is expected that the user is either using names or IDs but not a
         mixture of the two.
         In a later version it will be possible to filter for multiple departments.
-        Input dates expected to be date strings in yyyy-mm-dd format.
-        """
+        Input dates expected to be date strings in yyyy-mm-dd format, or date objects.
+        With stream set the shifts are yielded page by page rather than returned as a list.
+        shard splits the date range into windows fetched at once, as for get_schedules.
+        compact may be 'records' for records.Shift objects or 'table' for a records.Table of the shifts.
+        fields, e.g. ('id', 'starts_at', 'ends_at'), keeps only those fields of each shift; with compact the others are
+        None.
+        """
+        if compact:
+            shifts = self.get_shifts(location_id=location_id, loc_name=loc_name, department_id=department_id,
+                                     dep_name=dep_name, schedule_id=schedule_id, start_date=start_date,
+                                     end_date=end_date, stream=stream, shard=shard, fields=fields)
+            return self._compact(shifts, Shift, compact, stream)
         if schedule_id:
             extension = 'schedules/{sch_id}/shifts.json'.format(sch_id=schedule_id)
-            return get(auth=self.auth, url=self.base_url + extension)
+            return self._get(extension, stream=stream, fields=fields)
         params = {}
         if location_id or loc_name:
             if not location_id:
@@ -150,19 +396,8 @@ class StaffoAccount:
                 department_id = self.departments[loc_name][dep_name]
             params.update({'department_ids[]': department_id})
         if start_date:
-            start_tz = self.timezone.localize(datetime.strptime(start_date, '%Y-%m-%d'))
-            start_tz = datetime.strftime(start_tz, '%z')
-            start_tz = start_tz[:3] + ':' + start_tz[3:]
-            if not end_date:
-                end_tz = datetime.now(tz=self.timezone)
-            else:
-                end_tz = self.timezone.localize(datetime.strptime(end_date, '%Y-%m-%d'))
-            end_date = end_tz.strftime('%Y-%m-%d')
-            end_tz = end_tz.strftime('%z')
-            end_tz = end_tz[:3] + ':' + end_tz[3:]
-            params.update({'from': '{st_date}T00:00:00{st_tz}'.format(st_date=start_date, st_tz=start_tz),
-                           'until': '{en_date}T23:59:59{en_tz}'.format(en_date=end_date, en_tz=end_tz)})
-        return get(auth=self.auth, url=self.base_url + extension, extras=params)
+            return self._dated(extension, params, start_date, end_date, shard=shard, stream=stream, fields=fields)
+        return self._get(extension, extras=params, stream=stream, fields=fields)
 
     def add_users(self, department_id=None, loc_name=None, dep_name=None, users=None, remove=False):
         """
@@ -177,7 +412,30 @@ class StaffoAccount:
         else:
             extension += 'add_users.json'
         params = {'user_ids': users}
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
+
+    def sync_department_members(self, department_id=None, loc_name=None, dep_name=None, user_ids=None,
+                                chunk_size=membership.CHUNK_SIZE):
+        """
+        Makes the members of a department, identified either by its ID or by its location and department names,
+        exactly the given user ids. Only the users to add and remove are sent, up to chunk_size per call.
+        user_ids must be given; pass an empty list to remove every member.
+        Returns a membership.Membership of the ids added and removed and the responses.
+        """
+        if user_ids is None:
+            raise ValueError('user_ids is required; pass [] to remove every member')
+        departments = self.departments
+        if not department_id:
+            department_id = departments[loc_name][dep_name]
+        return membership.sync(self, department_id, user_ids, chunk_size=chunk_size)
+
+    def sync_memberships(self, memberships, chunk_size=membership.CHUNK_SIZE):
+        """
+        Applies sync_department_members to a dictionary of department ids to user ids, with up to the account's
+        number of workers departments at a time. Returns a dictionary of department ids to their Memberships.
+        """
+        self.departments  # loads the departments, so the registry knows each department's location
+        return membership.sync_all(self, memberships, chunk_size=chunk_size)
 
     def update_location(self, location_id=None, loc_name=None, **kwargs):
         """
@@ -190,16 +448,15 @@ class StaffoAccount:
         params = {}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        response = requests.put(auth=self.auth, url=self.base_url + extension, json=params)
-        if response.status_code is 200 and 'name' in kwargs.keys():
-            data = json.loads(response.content.decode('utf-8'))
-            locations = {self.locations[key]: key for key in self.locations.keys()}
-            old_name = locations[data['id']]
-            self.departments[data['name']] = self.departments.pop(old_name)
-            locations.update({data['id']: data['name']})
-            self.locations = {locations[key]: key for key in locations}
+        response = self._put(extension, params)
+        if 'name' in kwargs.keys():
+            return self._then(response, self._renamed_location)
         return response
 
+    def _renamed_location(self, data):
+        self.registry.rename_location(data['id'], data['name'])
+        self._store_mappings()
+
     def update_department(self, department_id=None, loc_name=None, dep_name=None, **kwargs):
         """
         Update a department's details. Refer to Staffomatic's own API documentation for the parameters that can be
@@ -211,19 +468,15 @@ class StaffoAccount:
         params = {}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        response = requests.put(auth=self.auth, url=self.base_url + extension, json=params)
-        if response.status_code is 200 and 'name' in kwargs.keys():
-            data = json.loads(response.content.decode('utf-8'))
-            for key in self.departments:
-                location_departments = self.departments[key]
-                location_departments = {location_departments[k]: k for k in location_departments}
-                if data['id'] in location_departments:
-                    location_departments.update({data['id']: data['name']})
-                    location_departments = {location_departments[k]: k for k in location_departments}
-                    self.departments[key] = location_departments
-                    break
+        response = self._put(extension, params)
+        if 'name' in kwargs.keys():
+            return self._then(response, self._renamed_department)
         return response
 
+    def _renamed_department(self, data):
+        self.registry.rename_department(data['id'], data['name'])
+        self._store_mappings()
+
     def update_schedule(self, schedule_id=None, **kwargs):
         """
         Update a schedule's details. Refer to Staffomatic's own API documentation for the parameters that can be
@@ -233,7 +486,7 @@ class StaffoAccount:
         params = {}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
     def publish_schedule(self, schedule_id=None, deliver_emails=True):
         """
@@ -241,7 +494,7 @@ class StaffoAccount:
         """
         extension = 'schedules/{sch_id}.json'.format(sch_id=schedule_id)
         params = {'do': 'publish', 'message': 'A new schedule is available!', 'deliver_emails': deliver_emails}
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
     def update_user(self, user_id=None, **kwargs):
         """
@@ -252,7 +505,7 @@ class StaffoAccount:
         params = {}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
     def lock_user(self, user_id=None, unlock=False):
         """
@@ -263,7 +516,7 @@ class StaffoAccount:
             params = {'do': 'lock'}
         else:
             params = {'do': 'unlock'}
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
     def update_shift(self, shift_id=None, **kwargs):
         """
@@ -274,7 +527,7 @@ class StaffoAccount:
         params = {}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
     def create_location(self, loc_name=None, allow_self_assign=True, applications_visible=False,
                         assignments_visible=True, first_day_of_week=0, swap_shifts=True, users_sort_by='alphabetical',
@@ -288,12 +541,12 @@ class StaffoAccount:
                   'allow_self_remove': allow_self_remove}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        response = requests.post(auth=self.auth, url=self.base_url + 'locations.json', json=params)
-        if response.status_code is 200:
-            data = json.loads(response.content.decode('utf-8'))
-            self.locations.update({data['name']: data['id']})
-            self.departments.update({data['name']: {}})
-        return response
+        response = self._post('locations.json', params)
+        return self._then(response, self._created_location)
+
+    def _created_location(self, data):
+        self.registry.add_location(data['id'], data['name'])
+        self._store_mappings()
 
     def create_department(self, location_id=None, loc_name=None, dep_name=None, visibility='staff', color='4286f4',
                           user_selectable=True, include_weekends=True, position=1, **kwargs):
@@ -307,14 +560,12 @@ class StaffoAccount:
                   'include_weekends': include_weekends, 'position': position}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        response = requests.post(auth=self.auth, url=self.base_url + extension, json=params)
-        if response.status_code is 200:
-            data = json.loads(response.content.decode('utf-8'))
-            if not loc_name:
-                locations = {self.locations[key]: key for key in self.locations}
-                loc_name = locations[location_id]
-            self.departments[loc_name].update({data['name']: data['id']})
-        return response
+        response = self._post(extension, params)
+        return self._then(response, lambda data: self._created_department(data, location_id))
+
+    def _created_department(self, data, location_id):
+        self.registry.add_department(location_id, data['id'], data['name'])
+        self._store_mappings()
 
     def create_schedule(self, location_id=None, loc_name=None, bop=None, eop=None, deadline=None, first_day_of_week=1,
                         slot_minutes=30, min_time=0, max_time=24, default_event_minutes=240, show_event_header=False,
@@ -335,7 +586,7 @@ class StaffoAccount:
         for key in kwargs:
             params.update({key: kwargs[key]})
         extension = 'locations/{loc_id}/schedules.json'.format(loc_id=location_id)
-        return requests.post(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._post(extension, params)
 
     def invite_user(self, location_id=None, loc_name=None, email=None, department_ids=None, dep_names=None, **kwargs):
         """
@@ -350,7 +601,7 @@ class StaffoAccount:
         params = {'email': email, 'department_ids': department_ids, 'do': 'send_invitation'}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return requests.post(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._post(extension, params)
 
     def create_user(self, location_id=None, loc_name=None, first_name=None, last_name=None, department_ids=None):
         """
@@ -360,24 +611,18 @@ class StaffoAccount:
             location_id = self.locations[loc_name]
         extension = 'locations/{loc_id}/users.json'.format(loc_id=location_id)
         params = {'first_name': first_name, 'last_name': last_name, 'department_ids': department_ids}
-        return requests.post(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._post(extension, params)
 
     def create_shift(self, location_id=None, loc_name=None, department_id=None, dep_name=None, schedule_id=None,
                      starts_at=None, ends_at=None, desired_coverage=1, note=None, **kwargs):
         """
         Create a new shift within a Staffomatic location and for a particular department.
-        The input datetimes are expected to be in the format yyyy-mm-dd HH:MM:SS as strings.
+        The input datetimes are expected to be strings in the format yyyy-mm-dd HH:MM:SS, or datetime objects, in
+        local time.
         The schedule id must be specified.
         In the next version this will be simplified.
         """
-        start_tz = self.timezone.localize(datetime.strptime(starts_at, '%Y-%m-%d %H:%M:%S'))
-        start_tz = datetime.strftime(start_tz, '%z')
-        start_tz = start_tz[:3] + ':' + start_tz[3:]
-        starts_at = starts_at[:10] + 'T' + starts_at[11:] + start_tz
-        end_tz = self.timezone.localize(datetime.strptime(ends_at, '%Y-%m-%d %H:%M:%S'))
-        end_tz = datetime.strftime(end_tz, '%z')
-        end_tz = end_tz[:3] + ':' + end_tz[3:]
-        ends_at = ends_at[:10] + 'T' + ends_at[11:] + end_tz
+        starts_at, ends_at = self.times.format_many((starts_at, ends_at))
         if not location_id:
             location_id = self.locations[loc_name]
             department_id = self.departments[loc_name][dep_name]
@@ -386,45 +631,56 @@ class StaffoAccount:
                   'department_id': department_id, 'desired_coverage': desired_coverage, 'note': note}
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return requests.post(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._post(extension, params)
+
+    def create_shifts(self, batch, stop_on_error=False):
+        """
+        Creates many shifts, up to the account's number of workers at a time. batch is an iterable of dictionaries of
+        create_shift's keyword arguments. Returns a bulk.Result per shift in the order given; with stop_on_error no
+        further shifts are started once one has failed.
+        """
+        return run(lambda kwargs: self.create_shift(**kwargs), batch, workers=self.workers,
+                   stop_on_error=stop_on_error)
 
     def assign_user_to_shift(self, shift_id=None, user_id=None):
         """
-        Assigns user_id to shift_id. No bulk method available yet.
+        Assigns user_id to shift_id. See assign_users_to_shifts for making many assignments.
         """
         extension = 'shifts/{shft_id}/assign.json'.format(shft_id=shift_id)
         params = {'user_id': user_id}
-        return requests.put(auth=self.auth, url=self.base_url + extension, json=params)
+        return self._put(extension, params)
 
-    def get_events(self, start_date=None, end_date=None, delivery_state='all', event_type=None, **kwargs):
+    def assign_users_to_shifts(self, pairs, stop_on_error=False):
         """
-        Collects the events...
+        Makes many assignments, up to the account's number of workers at a time. pairs is an iterable of
+        (shift_id, user_id) tuples. Returns a bulk.Result per pair in the order given; with stop_on_error no further
+        assignments are started once one has failed.
         """
+        return run(lambda pair: self.assign_user_to_shift(shift_id=pair[0], user_id=pair[1]), pairs,
+                   workers=self.workers, stop_on_error=stop_on_error)
+
+    def get_events(self, start_date=None, end_date=None, delivery_state='all', event_type=None, stream=False,
+                   shard=None, compact=None, fields=None, **kwargs):
+        """
+        Collects the events...
+        With stream set the events are yielded page by page rather than returned as a list.
+        shard splits the date range into windows fetched at once, as for get_schedules.
+        compact may be 'records' for records.Event objects or 'table' for a records.Table of the events.
+        fields keeps only those fields of each event, as for get_shifts.
+        """
+        if compact:
+            events = self.get_events(start_date=start_date, end_date=end_date, delivery_state=delivery_state,
+                                     event_type=event_type, stream=stream, shard=shard, fields=fields, **kwargs)
+            return self._compact(events, Event, compact, stream)
         extension = 'events.json'
         params = {'delivery_state': delivery_state}
         if event_type:
             params.update({'event_type[]': event_type})
-        if start_date:
-            start_tz = self.timezone.localize(datetime.strptime(start_date, '%Y-%m-%d'))
-            start_tz = datetime.strftime(start_tz, '%z')
-            start_tz = start_tz[:3] + ':' + start_tz[3:]
-            if not end_date:
-                end_tz = datetime.now(tz=self.timezone)
-            else:
-                end_tz = self.timezone.localize(datetime.strptime(end_date, '%Y-%m-%d'))
-            end_date = end_tz.strftime('%Y-%m-%d')
-            end_tz = end_tz.strftime('%z')
-            end_tz = end_tz[:3] + ':' + end_tz[3:]
-            params.update({
-                'from': '{st_date}T00:00:00{st_tz}'.format(st_date=start_date, st_tz=start_tz),
-                'until': '{en_date}T23:59:59{en_tz}'.format(en_date=end_date, en_tz=end_tz)
-            })
-            for key in kwargs:
-                params.update({key: kwargs[key]})
-            return get(auth=self.auth, url=self.base_url + extension, extras=params)
         for key in kwargs:
             params.update({key: kwargs[key]})
-        return get(auth=self.auth, url=self.base_url + extension, extras=params)
+        if start_date:
+            return self._dated(extension, params, start_date, end_date, shard=shard, stream=stream, fields=fields)
+        return self._get(extension, extras=params, stream=stream, fields=fields)
 
     def get_user_applications(self, user_id):
         """
@@ -432,4 +688,12 @@ class StaffoAccount:
         """
         extension = 'applications.json'
         params = {'user_ids': user_id}
-        return get(auth=self.auth, url=self.base_url + extension, extras=params)
+        return self._get(extension, extras=params)
+
+    def sync(self, resource, snapshot, **kwargs):
+        """
+        Brings a local incremental.Snapshot of 'shifts', 'users', 'schedules' or 'applications' up to date, fetching
+        only what has changed since the resource was last synced, and returns the incremental.Changes made.
+        Any keyword arguments are passed as filters, e.g. from/until to bound the first, full fetch.
+        """
+        return incremental.sync(self, resource, snapshot, extras=kwargs)
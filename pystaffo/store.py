@@ -0,0 +1,162 @@
+"""
+A ShiftStore holds shifts and users fetched from the API in indexed structures, so that planning questions such as
+who is on shift at a given time, which shifts are short of staff or what a user is assigned to can be answered locally
+without rescanning lists or calling the API again.
+Shifts are indexed by location, department, schedule and assigned user, and by time with a sorted index of start times
+which, bounded by the longest shift held, finds the shifts overlapping any period with two binary searches.
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime
+from .dates import parse
+
+SHIFT_KEYS = ('location_id', 'department_id', 'schedule_id')
+
+
+def _timestamp(moment):
+    """
+    POSIX timestamp of a timezone-aware datetime or an ISO 8601 string; numbers are taken to be timestamps already.
+    """
+    if isinstance(moment, (int, float)):
+        return float(moment)
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    return parse(moment).timestamp()
+
+
+class ShiftStore:
+    def __init__(self, shifts=(), users=()):
+        self.shifts = {}
+        self.users = {}
+        self._spans = {}
+        self._starts = []
+        self._longest = 0.0
+        self._by = {key: defaultdict(set) for key in SHIFT_KEYS + ('user_id',)}
+        self._users_by_department = defaultdict(set)
+        self.add_shifts(shifts)
+        self.add_users(users)
+
+    def add_shifts(self, shifts):
+        """
+        Adds shifts, as returned by get_shifts, replacing any already held with the same id. The start times of new
+        shifts are sorted into the time index together, once per call; only replacements are inserted one by one.
+        """
+        new = {}
+        for shift in shifts:
+            start, end = _timestamp(shift['starts_at']), _timestamp(shift['ends_at'])
+            if shift['id'] in new:
+                self._unindex(shift['id'])
+                new[shift['id']] = (start, shift['id'])
+            elif shift['id'] in self.shifts:
+                self.remove_shift(shift['id'])
+                insort(self._starts, (start, shift['id']))
+            else:
+                new[shift['id']] = (start, shift['id'])
+            self.shifts[shift['id']] = shift
+            self._spans[shift['id']] = (start, end)
+            self._longest = max(self._longest, end - start)
+            for key in SHIFT_KEYS:
+                self._by[key][shift.get(key)].add(shift['id'])
+            for user_id in shift.get('assigned_user_ids') or ():
+                self._by['user_id'][user_id].add(shift['id'])
+        if new:
+            self._starts.extend(new.values())
+            self._starts.sort()
+
+    def remove_shift(self, shift_id):
+        start = self._unindex(shift_id)
+        del self._starts[bisect_left(self._starts, (start, shift_id))]
+
+    def _unindex(self, shift_id):
+        """
+        Removes a shift from every index but the time index, returning its start.
+        """
+        shift = self.shifts.pop(shift_id)
+        start, end = self._spans.pop(shift_id)
+        for key in SHIFT_KEYS:
+            self._by[key][shift.get(key)].discard(shift_id)
+        for user_id in shift.get('assigned_user_ids') or ():
+            self._by['user_id'][user_id].discard(shift_id)
+        return start
+
+    def add_users(self, users):
+        """
+        Adds users, as returned by get_all_users or get_loc_users, replacing any already held with the same id.
+        """
+        for user in users:
+            for department_id in (self.users.get(user['id']) or {}).get('department_ids') or ():
+                self._users_by_department[department_id].discard(user['id'])
+            self.users[user['id']] = user
+            for department_id in user.get('department_ids') or ():
+                self._users_by_department[department_id].add(user['id'])
+
+    def _matching(self, **filters):
+        """
+        The ids of the shifts matching every given filter (location_id, department_id, schedule_id, user_id), or None
+        if no filters are given.
+        """
+        ids = None
+        for key, value in filters.items():
+            if value is not None:
+                matches = self._by[key].get(value, set())
+                ids = set(matches) if ids is None else ids & matches
+        return ids
+
+    def overlapping(self, starts_at, ends_at, location_id=None, department_id=None, schedule_id=None, user_id=None):
+        """
+        The shifts that overlap the period from starts_at to ends_at (timezone-aware datetimes or ISO 8601 strings),
+        optionally filtered, in order of their start.
+        """
+        start, end = _timestamp(starts_at), _timestamp(ends_at)
+        ids = self._matching(location_id=location_id, department_id=department_id, schedule_id=schedule_id,
+                             user_id=user_id)
+        first = bisect_left(self._starts, (start - self._longest,))
+        last = bisect_left(self._starts, (end,))
+        return [self.shifts[shift_id] for shift_start, shift_id in self._starts[first:last]
+                if self._spans[shift_id][1] > start and (ids is None or shift_id in ids)]
+
+    def at(self, moment, location_id=None, department_id=None, schedule_id=None):
+        """
+        The shifts running at a moment, optionally filtered.
+        """
+        moment = _timestamp(moment)
+        return [shift for shift in self.overlapping(moment, moment + 1e-6, location_id=location_id,
+                                                    department_id=department_id, schedule_id=schedule_id)
+                if self._spans[shift['id']][0] <= moment]
+
+    def on_shift(self, moment, location_id=None, department_id=None, schedule_id=None):
+        """
+        The users assigned to shifts running at a moment, e.g. who is working at 14:00 in a department. Users that
+        have not been added to the store are given as their ids.
+        """
+        user_ids = []
+        for shift in self.at(moment, location_id=location_id, department_id=department_id, schedule_id=schedule_id):
+            user_ids += [user_id for user_id in shift.get('assigned_user_ids') or () if user_id not in user_ids]
+        return [self.users.get(user_id, user_id) for user_id in user_ids]
+
+    def coverage_gaps(self, starts_at, ends_at, location_id=None, department_id=None, schedule_id=None):
+        """
+        The shifts in a period with fewer users assigned than their desired coverage, as (shift, shortfall) pairs.
+        """
+        gaps = []
+        for shift in self.overlapping(starts_at, ends_at, location_id=location_id, department_id=department_id,
+                                      schedule_id=schedule_id):
+            shortfall = (shift.get('desired_coverage') or 0) - len(shift.get('assigned_user_ids') or ())
+            if shortfall > 0:
+                gaps.append((shift, shortfall))
+        return gaps
+
+    def assignments(self, user_id, starts_at=None, ends_at=None):
+        """
+        The shifts a user is assigned to, in order of their start, optionally only those overlapping a period.
+        """
+        if starts_at is not None and ends_at is not None:
+            return self.overlapping(starts_at, ends_at, user_id=user_id)
+        return sorted((self.shifts[shift_id] for shift_id in self._by['user_id'].get(user_id, ())),
+                      key=lambda shift: self._spans[shift['id']][0])
+
+    def department_users(self, department_id):
+        """
+        The users that are members of a department.
+        """
+        return [self.users[user_id] for user_id in self._users_by_department.get(department_id, ())]
@@ -25,4 +25,5 @@ setup(
     ],
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={'async': ['aiohttp>=3.0'], 'fast': ['orjson']},
 )
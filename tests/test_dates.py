@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+import pytz
+from pystaffo.dates import TimeConverter, windows
+
+BERLIN = pytz.timezone('Europe/Berlin')
+
+
+class FormatTest(unittest.TestCase):
+    def setUp(self):
+        self.times = TimeConverter(BERLIN)
+
+    def test_naive_times_take_the_offset_of_their_date(self):
+        self.assertEqual(self.times.format('2024-01-15 09:00:00'), '2024-01-15T09:00:00+01:00')
+        self.assertEqual(self.times.format('2024-07-15 09:00:00'), '2024-07-15T09:00:00+02:00')
+
+    def test_aware_times_keep_their_side_of_the_fall_back_hour(self):
+        self.assertEqual(self.times.format(datetime(2024, 10, 27, 0, 30, tzinfo=pytz.utc)),
+                         '2024-10-27T02:30:00+02:00')
+        self.assertEqual(self.times.format(datetime(2024, 10, 27, 1, 30, tzinfo=pytz.utc)),
+                         '2024-10-27T02:30:00+01:00')
+
+    def test_aware_times_across_the_spring_forward(self):
+        self.assertEqual(self.times.format(datetime(2024, 3, 31, 0, 30, tzinfo=pytz.utc)),
+                         '2024-03-31T01:30:00+01:00')
+        self.assertEqual(self.times.format(datetime(2024, 3, 31, 1, 30, tzinfo=pytz.utc)),
+                         '2024-03-31T03:30:00+02:00')
+
+
+class RangeParamsTest(unittest.TestCase):
+    def setUp(self):
+        self.times = TimeConverter(BERLIN)
+
+    def test_until_on_the_day_the_clocks_go_back(self):
+        self.assertEqual(self.times.range_params('2024-10-01', '2024-10-27'),
+                         {'from': '2024-10-01T00:00:00+02:00', 'until': '2024-10-27T23:59:59+01:00'})
+
+    def test_until_on_the_day_the_clocks_go_forward(self):
+        self.assertEqual(self.times.range_params('2024-03-31', '2024-03-31'),
+                         {'from': '2024-03-31T00:00:00+01:00', 'until': '2024-03-31T23:59:59+02:00'})
+
+
+class WindowsTest(unittest.TestCase):
+    def test_shards(self):
+        self.assertEqual(list(windows('2024-01-30', '2024-03-02', 'month')),
+                         [('2024-01-30', '2024-01-31'), ('2024-02-01', '2024-02-29'), ('2024-03-01', '2024-03-02')])
+        self.assertEqual(list(windows('2024-01-01', '2024-01-05', 2)),
+                         [('2024-01-01', '2024-01-02'), ('2024-01-03', '2024-01-04'), ('2024-01-05', '2024-01-05')])
+
+    def test_shards_that_would_never_end_are_refused(self):
+        for shard in (0, -1, 'year', 1.5, None):
+            with self.assertRaises(ValueError):
+                list(windows('2024-01-01', '2024-01-31', shard))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from pystaffo import StaffoAccount, membership
+from pystaffo.registry import Registry
+
+
+class FakeAccount:
+    """
+    Stands in for a StaffoAccount with one department (100, in location 1) whose members are 1, 2 and 3.
+    """
+    workers = 2
+
+    def __init__(self):
+        self.registry = Registry({'Westway': 1}, {'Westway': {'Bar': 100}})
+        self.calls = []
+
+    def _get(self, extension, extras=None):
+        return [{'id': user_id} for user_id in (1, 2, 3)]
+
+    def add_users(self, department_id=None, users=None, remove=False):
+        self.calls.append(('remove' if remove else 'add', department_id, list(users)))
+        return 'response'
+
+
+class SyncTest(unittest.TestCase):
+    def test_missing_user_ids_is_refused(self):
+        account = FakeAccount()
+        with self.assertRaises(ValueError):
+            membership.sync(account, 100, None)
+        with self.assertRaises(ValueError):
+            membership.sync_all(account, {100: None})
+        self.assertEqual(account.calls, [])
+
+    def test_account_refuses_missing_user_ids_before_any_request(self):
+        account = StaffoAccount('example', 'user', 'password')
+        with self.assertRaises(ValueError):
+            account.sync_department_members(department_id=100)
+        self.assertIsNone(account._registry)
+
+    def test_empty_list_removes_every_member(self):
+        account = FakeAccount()
+        changes = membership.sync(account, 100, [])
+        self.assertEqual(changes.removed, [1, 2, 3])
+        self.assertEqual(account.calls, [('remove', 100, [1, 2, 3])])
+
+    def test_only_the_difference_is_sent_in_chunks(self):
+        account = FakeAccount()
+        changes = membership.sync(account, 100, [2, 3, 4, 5, 6], chunk_size=2)
+        self.assertEqual((changes.added, changes.removed), ([4, 5, 6], [1]))
+        self.assertEqual(account.calls, [('add', 100, [4, 5]), ('add', 100, [6]), ('remove', 100, [1])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import aiohttp
+import requests
+from pystaffo.asynchronous import AsyncRequestScheduler
+from pystaffo.scheduler import RequestScheduler, TokenBucket
+
+
+class DroppingHandler(BaseHTTPRequestHandler):
+    """
+    Reads each request, counts it by method and then closes the connection without answering.
+    """
+    def handle_request(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.counts[self.command] = self.server.counts.get(self.command, 0) + 1
+        self.close_connection = True
+
+    do_GET = do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class DroppedConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), DroppingHandler)
+        self.server.counts = {}
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{port}/v3/schedules.json'.format(port=self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def scheduler(self, session):
+        return RequestScheduler(session, rate_limiter=TokenBucket(1000, 100), max_retries=3, base=0)
+
+    def test_post_is_sent_once(self):
+        with requests.Session() as session:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.scheduler(session).request('POST', self.url, json={'schedule': {}})
+        self.assertEqual(self.server.counts, {'POST': 1})
+
+    def test_get_is_retried(self):
+        with requests.Session() as session:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.scheduler(session).request('GET', self.url)
+        self.assertEqual(self.server.counts, {'GET': 4})
+
+    def test_async_post_is_sent_once(self):
+        async def post():
+            async with aiohttp.ClientSession() as session:
+                scheduler = AsyncRequestScheduler(session, rate_limiter=TokenBucket(1000, 100), max_retries=3, base=0)
+                await scheduler.request('POST', self.url, json={'schedule': {}})
+
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            asyncio.run(post())
+        self.assertEqual(self.server.counts, {'POST': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()